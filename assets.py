@@ -0,0 +1,107 @@
+import os
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Welcome GIF - startup ke baad background me download hota hai
+ANIMATION_URL = os.environ.get("ANIMATION_URL", "https://files.catbox.moe/zvv7fa.gif")
+WELCOME_GIF = 'welcome.gif'
+# GIF download ka timeout (seconds)
+ANIMATION_TIMEOUT = float(os.environ.get("ANIMATION_TIMEOUT", 30))
+
+
+def _download(url, path, timeout):
+    """Blocking download into path (atomic rename, so a half file is never visible)"""
+    # requests sirf yahin chahiye - startup pe import nahi
+    import requests
+
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    }
+    response = requests.get(url, timeout=timeout, stream=True, headers=headers)
+    if response.status_code != 200:
+        raise RuntimeError(f"status {response.status_code}")
+    partial = path + '.part'
+    with open(partial, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                f.write(chunk)
+    os.replace(partial, path)
+
+
+def _draw_fallback(path):
+    """Blocking: draw a simple static welcome image with PIL"""
+    # PIL bhaari hai - sirf download fail hone par import
+    from PIL import Image, ImageDraw, ImageFont
+
+    img = Image.new('RGB', (400, 200), color='darkblue')
+    d = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype("arial.ttf", 30)
+    except Exception:
+        font = ImageFont.load_default()
+    d.text((100, 80), "🤖 Join Hider Bot", fill='white', font=font)
+    d.text((120, 120), "Welcome!", fill='yellow', font=font)
+    partial = path + '.part'
+    img.save(partial, format='GIF')
+    os.replace(partial, path)
+
+
+class WelcomeAsset:
+    """Welcome GIF that is fetched in the background after startup.
+
+    Bot pehle updates lena shuru karta hai; GIF download (ya fail hone par
+    PIL se fallback image) ek thread me hota hai. Tab tak welcome URL se
+    jaata hai, aur URL bhi na chale to sirf text.
+    """
+
+    def __init__(self, url=ANIMATION_URL, path=WELCOME_GIF, timeout=ANIMATION_TIMEOUT):
+        self.url = url
+        self.path = path
+        self.timeout = timeout
+        self.ready = os.path.exists(path)
+        self._task = None
+
+    def source(self):
+        """Local file once it is ready, else the URL (None if there is neither)"""
+        if self.ready:
+            return self.path
+        return self.url or None
+
+    def start(self):
+        """Begin fetching in the background (no-op if the file is already there)"""
+        if self.ready or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._prepare())
+
+    async def _prepare(self):
+        started = time.monotonic()
+        if self.url:
+            try:
+                await asyncio.to_thread(_download, self.url, self.path, self.timeout)
+                self.ready = True
+                logger.info(f"✅ Welcome GIF downloaded in {time.monotonic() - started:.2f}s")
+                return
+            except Exception as e:
+                logger.error(f"❌ Error downloading GIF: {e}")
+        else:
+            logger.warning("❌ No animation URL provided in environment variables")
+
+        try:
+            await asyncio.to_thread(_draw_fallback, self.path)
+            self.ready = True
+            logger.info(f"✅ Created fallback image in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"❌ Failed to create image: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Shared instance
+welcome_asset = WelcomeAsset()
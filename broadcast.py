@@ -0,0 +1,321 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+
+import html
+
+from telegram.error import RetryAfter, Forbidden, BadRequest, ChatMigrated
+
+from storage import db, JOB_RUNNING, JOB_DONE, JOB_CANCELLED
+from registry import registry
+from metrics import BROADCAST_MESSAGES, BROADCAST_THROTTLED
+from scheduler import BROADCAST
+
+logger = logging.getLogger(__name__)
+
+# Telegram bulk limit ~30 messages/second
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", 30))
+BROADCAST_WORKERS = int(os.environ.get("BROADCAST_WORKERS", 10))
+BROADCAST_MAX_RETRIES = int(os.environ.get("BROADCAST_MAX_RETRIES", 3))
+# Delivery status kitne results ya seconds ke baad DB me likha jaaye
+JOB_FLUSH_SIZE = int(os.environ.get("BROADCAST_FLUSH_SIZE", 100))
+JOB_FLUSH_INTERVAL = float(os.environ.get("BROADCAST_FLUSH_INTERVAL", 2))
+# Recipients DB se kitne-kitne karke aayein (memory isi se bounded rehti hai)
+RECIPIENT_BATCH_SIZE = int(os.environ.get("BROADCAST_FETCH_SIZE", 500))
+# Running job ka lease - itne seconds renew na ho (process mar gaya) to doosra replica job utha leta hai
+JOB_LEASE = float(os.environ.get("BROADCAST_JOB_LEASE", 60))
+# Is process ki pehchaan broadcast_jobs.owner me
+REPLICA_ID = os.environ.get("REPLICA_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Error classes
+SENT = 'sent'
+PERMANENT = 'permanent'
+TRANSIENT = 'transient'
+
+# Engine outcome -> broadcast_recipients.status
+RECIPIENT_STATUS = {SENT: 'sent', TRANSIENT: 'failed', PERMANENT: 'permanent'}
+
+
+def classify_error(error):
+    """Return PERMANENT for errors a retry cannot fix, TRANSIENT otherwise"""
+    # Blocked / kicked / chat not found / galat HTML - retry se kuch nahi badlega
+    if isinstance(error, (Forbidden, ChatMigrated, BadRequest)):
+        return PERMANENT
+    # TimedOut, NetworkError aur baaki sab dobara try karne layak hain
+    return TRANSIENT
+
+
+def inactive_reason(error):
+    """Why a recipient can never receive messages again, or None if it still can"""
+    if isinstance(error, ChatMigrated):
+        return 'migrated'
+    message = str(error).lower()
+    if isinstance(error, Forbidden):
+        for reason in ('blocked', 'kicked', 'deactivated'):
+            if reason in message:
+                return reason
+        return 'forbidden'
+    # Galat HTML jaise BadRequest message ki galti hain, recipient ki nahi
+    if isinstance(error, BadRequest) and ('chat not found' in message or 'user not found' in message):
+        return 'not_found'
+    return None
+
+
+class TokenBucket:
+    """Global token bucket; RetryAfter aane par poora bucket pause hota hai"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # Pause ke baad burst na aaye
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastEngine:
+    """Sends one message to many recipients with a bounded pool of concurrent senders.
+
+    Saare senders ek shared TokenBucket se rate lete hain, isliye allowed
+    rate poora use hota hai bina fixed sleep ke. RetryAfter poore bucket ko
+    pause karke usi recipient ko dobara try karta hai.
+    """
+
+    def __init__(self, bucket, workers=BROADCAST_WORKERS, max_retries=BROADCAST_MAX_RETRIES):
+        self.bucket = bucket
+        self.workers = workers
+        self.max_retries = max_retries
+
+    async def run(self, recipients, send, on_result=None, stop=None):
+        """Send to every (chat_id, label) in recipients (async iterable); returns result counters.
+
+        on_result(chat_id, outcome, error) har recipient ke baad call hota hai. stop
+        (asyncio.Event) set hote hi naye recipients lena band ho jaata hai.
+        """
+        result = {'total': 0, 'success': 0, 'failed': 0, 'permanent': 0}
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    if stop is not None and stop.is_set():
+                        continue
+                    outcome, error = await self._deliver(item, send)
+                    if on_result is not None:
+                        on_result(item[0], outcome, error)
+                    if outcome == SENT:
+                        result['success'] += 1
+                    else:
+                        result['failed'] += 1
+                        if outcome == PERMANENT:
+                            result['permanent'] += 1
+                finally:
+                    queue.task_done()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            # Queue bhari ho to put ruk jaata hai, isliye iterator bhi utna hi aage padhta hai
+            async for item in recipients:
+                if stop is not None and stop.is_set():
+                    break
+                result['total'] += 1
+                await queue.put(item)
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return result
+
+    async def _deliver(self, item, send):
+        chat_id, label = item
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await send(chat_id)
+                BROADCAST_MESSAGES.labels(SENT).inc()
+                return SENT, None
+            except RetryAfter as e:
+                # Flood control - sab senders ruk jaate hain, attempt count nahi hota
+                BROADCAST_THROTTLED.inc()
+                logger.warning(f"Broadcast throttled, pausing {e.retry_after}s")
+                self.bucket.pause(e.retry_after)
+                continue
+            except Exception as e:
+                kind = classify_error(e)
+                attempt += 1
+                if kind == PERMANENT or attempt > self.max_retries:
+                    BROADCAST_MESSAGES.labels(kind).inc()
+                    logger.error(f"Broadcast failed for {label} ({chat_id}): {e}")
+                    return kind, e
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+
+class BroadcastJobs:
+    """Persistent broadcast jobs with per-recipient delivery state.
+
+    Job banate waqt audience recipients table me snapshot hoti hai. Har
+    delivery ka status batches me likha jaata hai, isliye restart ke baad
+    job sirf pending recipients ke saath resume hota hai - duplicate nahi.
+
+    Kai replicas ek DB share karein to job wahi bhejta hai jiske paas uska
+    lease hai. Flusher har baar lease renew karta hai; renew na ho (job
+    kisi aur replica pe cancel hua, ya lease kho gaya) to sending ruk jaati hai.
+    """
+
+    def __init__(self, storage, engine, registry, flush_size=JOB_FLUSH_SIZE, flush_interval=JOB_FLUSH_INTERVAL,
+                 batch_size=RECIPIENT_BATCH_SIZE, owner=REPLICA_ID, lease=JOB_LEASE):
+        self.storage = storage
+        self.engine = engine
+        self.registry = registry
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.owner = owner
+        self.lease = lease
+        self._stops = {}    # job_id -> asyncio.Event (sirf running jobs)
+        self.stopping = asyncio.Event()     # pause_all ke baad koi job (dobara) shuru nahi hota
+
+    async def create(self, message, broadcast_type):
+        job_id, total = await self.storage.create_broadcast_job(message, broadcast_type)
+        # Banane wala replica hi bheje - resume job ise beech me na uthaye
+        await self.storage.claim_job(job_id, self.owner, self.lease)
+        return job_id, total
+
+    async def resumable(self):
+        """Running jobs that no live process is sending (this one included)"""
+        now = time.time()
+        return [job for job in await self.storage.get_running_jobs()
+                if job['id'] not in self._stops
+                and (job['owner'] in (None, self.owner) or (job['lease_until'] or 0) < now)]
+
+    async def cancel(self, job_id):
+        """Cancel a job; returns False if it is not running"""
+        job = await self.storage.get_job(job_id)
+        if not job or job['status'] != JOB_RUNNING:
+            return False
+        await self.storage.finish_job(job_id, JOB_CANCELLED)
+        stop = self._stops.get(job_id)
+        if stop is not None:
+            stop.set()
+        return True
+
+    def pause_all(self):
+        """Stop running jobs without finishing them - they resume on next startup"""
+        self.stopping.set()
+        for stop in self._stops.values():
+            stop.set()
+
+    async def progress(self, job_id):
+        job = await self.storage.get_job(job_id)
+        if job:
+            job['progress'] = await self.storage.get_job_progress(job_id)
+        return job
+
+    async def run(self, job_id, bot):
+        """Send a job to its pending recipients; returns the job with final progress"""
+        job = await self.storage.get_job(job_id)
+        if not job or job['status'] != JOB_RUNNING or job_id in self._stops or self.stopping.is_set():
+            return job
+        stop = self._stops[job_id] = asyncio.Event()
+        if not await self.storage.claim_job(job_id, self.owner, self.lease):
+            del self._stops[job_id]
+            logger.info(f"📢 Broadcast job #{job_id} is being sent by {job['owner']}")
+            return job
+
+        pending = []
+        flushes = set()
+        text = html.escape(job['message'])
+        deactivate = (self.registry.deactivate_chat if job['broadcast_type'] == 'groups'
+                      else self.registry.deactivate_user)
+
+        async def send(chat_id):
+            await bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML', rate_limit_args=BROADCAST)
+
+        async def flush():
+            rows = pending[:]
+            del pending[:]
+            if rows:
+                await self.storage.set_recipient_statuses(rows)
+
+        def start_flush():
+            # Har flush apna task - flusher cancel ho to bhi adhoori write poori hoti hai
+            # (warna likhe bina hate rows pending reh jaate aur dobara bheje jaate)
+            task = asyncio.create_task(flush())
+            flushes.add(task)
+            task.add_done_callback(flushes.discard)
+            return task
+
+        async def flusher():
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    await asyncio.shield(start_flush())
+                    # Lease renew - job kisi bhi replica pe cancel hua ho to yahin pata chalta hai
+                    if not await self.storage.renew_job(job_id, self.owner, self.lease):
+                        logger.info(f"📢 Broadcast job #{job_id} cancelled or taken over, stopping")
+                        stop.set()
+                        return
+                except Exception as e:
+                    logger.error(f"Broadcast job #{job_id} flush error: {e}")
+
+        def on_result(chat_id, outcome, error):
+            pending.append((RECIPIENT_STATUS[outcome], job_id, chat_id))
+            if outcome == PERMANENT:
+                # Kicked/blocked recipients agle broadcasts me nahi aayenge
+                reason = inactive_reason(error)
+                if reason:
+                    deactivate(chat_id, reason)
+            if len(pending) >= self.flush_size:
+                start_flush()
+
+        flush_task = asyncio.create_task(flusher())
+        try:
+            try:
+                recipients = self.storage.iter_pending_recipients(job_id, self.batch_size)
+                await self.engine.run(recipients, send, on_result=on_result, stop=stop)
+            finally:
+                flush_task.cancel()
+                await asyncio.gather(flush_task, *flushes, return_exceptions=True)
+                await flush()
+                del self._stops[job_id]
+
+            job = await self.storage.get_job(job_id)
+            if job['status'] == JOB_RUNNING and not stop.is_set():
+                await self.storage.finish_job(job_id, JOB_DONE)
+        finally:
+            # Ruka hua job turant chhodo - naya replica lease expire hone ka wait na kare
+            await self.storage.release_job(job_id, self.owner)
+        return await self.progress(job_id)
+
+
+# Shared bucket - ek saath chalne wale saare broadcasts ek hi global limit share karte hain
+broadcast_bucket = TokenBucket(BROADCAST_RATE)
+broadcaster = BroadcastEngine(broadcast_bucket)
+broadcast_jobs = BroadcastJobs(db, broadcaster, registry)
@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+
+from deleter import DELETE_MAX_AGE
+from metrics import CATCHUP_UPDATES, CATCHUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Restart ke baad pending updates drain karo (0 = purana behaviour, sab drop)
+CATCHUP = os.environ.get("CATCHUP", "1") != "0"
+# Itni der koi naya update na aaye to backlog khatam maan lo (seconds)
+CATCHUP_IDLE = float(os.environ.get("CATCHUP_IDLE", 5))
+
+
+class CatchUp:
+    """Tracks the drain of updates that piled up while the bot was down.
+
+    Startup pe getWebhookInfo se pending count milta hai; utne updates
+    process hone tak (ya CATCHUP_IDLE tak kuch na aaye to) catch-up mode
+    chalta hai. Is dauran 48 ghante se purane messages handler tak pahunchte
+    hi nahi - Telegram unhe delete hone hi nahi dega.
+    """
+
+    def __init__(self, enabled=CATCHUP, idle=CATCHUP_IDLE):
+        self.enabled = enabled
+        self.idle = idle
+        self.active = False
+        self.expected = 0
+        self.processed = 0
+        self.skipped = 0
+        self._started = 0
+        self._last_update = 0
+
+    async def begin(self, bot):
+        """Read the backlog size; returns True if there is anything to drain"""
+        if not self.enabled:
+            return False
+        try:
+            info = await bot.get_webhook_info()
+        except Exception as e:
+            logger.error(f"Catch-up: could not read pending updates: {e}")
+            return False
+        if not info.pending_update_count:
+            logger.info("📭 Catch-up: no pending updates")
+            return False
+        self.active = True
+        self.expected = info.pending_update_count
+        self.processed = self.skipped = 0
+        self._started = self._last_update = time.monotonic()
+        logger.info(f"📬 Catch-up: draining {self.expected} pending update(s)")
+        return True
+
+    def admit(self, update):
+        """False if the update should be dropped without running any handler"""
+        if not self.active:
+            return True
+        self._last_update = time.monotonic()
+        message = getattr(update, 'message', None)
+        if message is not None and time.time() - message.date.timestamp() > DELETE_MAX_AGE:
+            self.skipped += 1
+            return False
+        return True
+
+    def done(self):
+        """Count one backlog update as finished (processed or skipped)"""
+        if not self.active:
+            return
+        self.processed += 1
+        if self.processed >= self.expected:
+            self.finish()
+
+    def finish(self):
+        if not self.active:
+            return
+        self.active = False
+        elapsed = time.monotonic() - self._started
+        CATCHUP_UPDATES.labels('processed').set(self.processed - self.skipped)
+        CATCHUP_UPDATES.labels('skipped').set(self.skipped)
+        CATCHUP_SECONDS.set(elapsed)
+        rate = self.processed / elapsed if elapsed > 0 else 0
+        logger.info(f"✅ Catch-up done: {self.processed} update(s) in {elapsed:.1f}s ({rate:.0f}/s), "
+                    f"{self.skipped} older than 48h skipped")
+
+    async def job(self, context):
+        """job_queue callback - ends catch-up once updates stop arriving"""
+        if self.active and time.monotonic() - self._last_update > self.idle:
+            self.finish()
+        if not self.active:
+            context.job.schedule_removal()
+
+
+# Shared instance
+catchup = CatchUp()
@@ -0,0 +1,68 @@
+import os
+import logging
+
+from storage import db
+
+logger = logging.getLogger(__name__)
+
+# join/leave - sirf wahi service messages, all - har tarah ka service message
+# (pin, title/photo change, video chat waghera)
+SETTING_KEYS = ('join', 'leave', 'all')
+DEFAULT_SETTINGS = {'join': True, 'leave': True, 'all': False}
+# Shared (Postgres) DB pe doosre replicas ke toggles itne seconds me yahan dikhte hain
+CHAT_SETTINGS_REFRESH = float(os.environ.get("CHAT_SETTINGS_REFRESH", 30))
+
+
+class ChatSettings:
+    """Per-chat hide settings, held in memory for the update hot path.
+
+    Sirf wahi chats DB/memory me hain jinhone default badla hai; baaki sab
+    DEFAULT_SETTINGS use karte hain. Change seedhe DB me likha jaata hai aur
+    phir map update hota hai, isliye handler ko kabhi DB query nahi karni padti.
+    DB kai replicas share karein to map har CHAT_SETTINGS_REFRESH seconds me
+    dobara padha jaata hai (job), taaki doosre replica ka toggle bhi lage.
+    """
+
+    def __init__(self, storage, refresh_interval=CHAT_SETTINGS_REFRESH):
+        self.storage = storage
+        self.refresh_interval = refresh_interval
+        self._settings = {}     # chat_id -> {'join': bool, 'leave': bool, 'all': bool}
+        self._version = 0       # har local toggle pe +1
+
+    async def load(self):
+        await self.refresh()
+        logger.info(f"⚙️ Chat settings loaded: {len(self._settings)} customised chats")
+
+    async def refresh(self):
+        """Re-read every chat's settings; returns False if a local toggle raced the read"""
+        version = self._version
+        rows = await self.storage.load_chat_settings()
+        if version != self._version:
+            # Padhte waqt yahin toggle hua - purana snapshot use mita deta, agli baar
+            return False
+        self._settings = {chat_id: dict(zip(SETTING_KEYS, map(bool, values))) for chat_id, *values in rows}
+        return True
+
+    async def job(self, context):
+        """job_queue callback - picks up toggles made on other replicas"""
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Chat settings refresh error: {e}")
+
+    def get(self, chat_id):
+        """Settings for a chat (shared dict - do not modify)"""
+        return self._settings.get(chat_id, DEFAULT_SETTINGS)
+
+    async def toggle(self, chat_id, key):
+        """Flip one setting, persist it and return the chat's new settings"""
+        settings = dict(self.get(chat_id))
+        settings[key] = not settings[key]
+        await self.storage.save_chat_settings(chat_id, *(settings[k] for k in SETTING_KEYS))
+        self._settings[chat_id] = settings
+        self._version += 1
+        return settings
+
+
+# Shared instance
+chat_settings = ChatSettings(db)
@@ -0,0 +1,249 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+
+from telegram.error import RetryAfter, TimedOut, NetworkError, BadRequest
+
+from metrics import DELETE_LATENCY, DELETE_OUTCOMES, DELETE_RETRIES, DELETE_RETRY_QUEUE, delete_outcome
+from permissions import permissions
+
+logger = logging.getLogger(__name__)
+
+# Ek chat ke service messages kitni der tak jama karke ek saath delete hon
+DELETE_WINDOW = float(os.environ.get("DELETE_WINDOW_MS", 200)) / 1000
+# Telegram deleteMessages ek call me max 100 IDs leta hai
+DELETE_BATCH_SIZE = min(int(os.environ.get("DELETE_BATCH_SIZE", 100)), 100)
+# Retry queue me max kitne message IDs, aur backoff ka base/cap (seconds)
+DELETE_RETRY_QUEUE_SIZE = int(os.environ.get("DELETE_RETRY_QUEUE_SIZE", 10000))
+DELETE_RETRY_BASE = float(os.environ.get("DELETE_RETRY_BASE", 1))
+DELETE_RETRY_CAP = float(os.environ.get("DELETE_RETRY_CAP", 300))
+# Telegram 48 ghante se purane messages delete nahi karne deta (thoda margin)
+DELETE_MAX_AGE = 48 * 3600 - 60
+
+
+def is_transient(error):
+    """True for delete errors worth retrying (flood control, timeouts, 5xx)"""
+    if isinstance(error, (RetryAfter, TimedOut)):
+        return True
+    # BadRequest bhi NetworkError ka subclass hai, par wo permanent hai
+    return isinstance(error, NetworkError) and not isinstance(error, BadRequest)
+
+
+class DeletionBuffer:
+    """Per-chat buffer that coalesces service-message deletes into deleteMessages calls.
+
+    Pehla message aate hi chat ka window timer shuru hota hai; window khatam
+    hone par ya batch bharte hi saare IDs ek bulk call me delete hote hain.
+    Bulk call fail ho to har message alag se delete kiya jaata hai.
+
+    Transient failures (RetryAfter, timeout, 5xx) retry queue me jaate hain:
+    exponential backoff + jitter, RetryAfter us chat ke liye alag se, aur
+    48 ghante ki delete window nikal jaane par item drop.
+    """
+
+    def __init__(self, window=DELETE_WINDOW, batch_size=DELETE_BATCH_SIZE, retry_limit=DELETE_RETRY_QUEUE_SIZE):
+        self.window = window
+        self.batch_size = batch_size
+        self.retry_limit = retry_limit
+        self._pending = {}    # chat_id -> [message_id, ...]
+        self._sent_at = {}    # chat_id -> pending batch ke sabse purane message ka time
+        self._timers = {}     # chat_id -> window task
+        self._tasks = set()
+        # Retry queue - (due, sent_at, seq, bot, chat_id, ids, attempt) ka heap
+        self._retry = []
+        self._retry_size = 0
+        self._seq = itertools.count()
+        self._blocked = {}    # chat_id -> RetryAfter khatam hone ka monotonic time
+        self._retry_wakeup = asyncio.Event()
+        self._retry_task = None
+
+    def add(self, bot, chat_id, message_id, sent_at=None):
+        ids = self._pending.setdefault(chat_id, [])
+        ids.append(message_id)
+        self._sent_at.setdefault(chat_id, sent_at or time.time())
+        if len(ids) >= self.batch_size:
+            timer = self._timers.pop(chat_id, None)
+            if timer is not None:
+                timer.cancel()
+            # IDs abhi nikaal lo, taaki naye messages agle batch me jaayein
+            self._spawn(self._delete(bot, chat_id, self._pending.pop(chat_id), self._sent_at.pop(chat_id)))
+        elif chat_id not in self._timers:
+            self._timers[chat_id] = self._spawn(self._flush_later(bot, chat_id))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self, bot, chat_id):
+        await asyncio.sleep(self.window)
+        self._timers.pop(chat_id, None)
+        ids = self._pending.pop(chat_id, None)
+        sent_at = self._sent_at.pop(chat_id, None)
+        if ids:
+            await self._delete(bot, chat_id, ids, sent_at)
+
+    async def _call(self, bot, chat_id, ids):
+        """One timed delete call (bulk or single); returns the error or None"""
+        method = 'single' if len(ids) == 1 else 'bulk'
+        started = time.monotonic()
+        try:
+            if len(ids) == 1:
+                await bot.delete_message(chat_id=chat_id, message_id=ids[0])
+            else:
+                await bot.delete_messages(chat_id=chat_id, message_ids=ids)
+            error = None
+        except Exception as e:
+            error = e
+        DELETE_LATENCY.labels(method).observe(time.monotonic() - started)
+        return error
+
+    async def _delete(self, bot, chat_id, ids, sent_at, attempt=0, retried=False):
+        if time.time() - sent_at > DELETE_MAX_AGE:
+            # Telegram mana hi karega - call bekaar hai
+            self._expired(chat_id, ids)
+            return
+        if self._blocked.get(chat_id, 0) > time.monotonic():
+            # Is chat pe RetryAfter chal raha hai - call mat karo, baad me
+            self._schedule_retry(bot, chat_id, ids, sent_at, attempt)
+            return
+
+        error = await self._call(bot, chat_id, ids)
+        if error is None:
+            self._deleted(chat_id, ids, retried)
+            return
+        if is_transient(error):
+            self._schedule_retry(bot, chat_id, ids, sent_at, attempt, error)
+            return
+        if delete_outcome(error) == 'no_permission':
+            # Rights shayad chhin gaye - agla service message getChatMember se dobara check karega.
+            # Ek ek karke try karna bekaar hai, har call wahi error dega
+            permissions.forget(chat_id)
+            DELETE_OUTCOMES.labels('no_permission').inc(len(ids))
+            logger.error(f"Delete service message error in {chat_id} ({len(ids)} message(s)): {error}")
+            return
+        if len(ids) == 1:
+            DELETE_OUTCOMES.labels(delete_outcome(error)).inc()
+            logger.error(f"Delete service message error in {chat_id}: {error}")
+            return
+        logger.warning(f"Bulk delete failed in {chat_id}, deleting one by one: {error}")
+
+        deleted = []
+        retry = []
+        retry_error = None
+        for index, message_id in enumerate(ids):
+            error = await self._call(bot, chat_id, [message_id])
+            if error is None:
+                deleted.append(message_id)
+            elif isinstance(error, RetryAfter):
+                # Baaki sab bhi isi chat ke hain - saath me retry
+                retry.extend(ids[index:])
+                retry_error = error
+                break
+            elif is_transient(error):
+                retry.append(message_id)
+                retry_error = error
+            else:
+                DELETE_OUTCOMES.labels(delete_outcome(error)).inc()
+                logger.error(f"Delete service message error in {chat_id}: {error}")
+        if deleted:
+            self._deleted(chat_id, deleted, retried)
+        if retry:
+            self._schedule_retry(bot, chat_id, retry, sent_at, attempt, retry_error)
+
+    def _deleted(self, chat_id, ids, retried):
+        DELETE_OUTCOMES.labels('ok').inc(len(ids))
+        if retried:
+            DELETE_RETRIES.labels('succeeded').inc(len(ids))
+        logger.info(f"🧹 {len(ids)} service message(s) hidden in {chat_id}")
+
+    def _expired(self, chat_id, ids):
+        DELETE_OUTCOMES.labels('expired').inc(len(ids))
+        DELETE_RETRIES.labels('expired').inc(len(ids))
+        logger.warning(f"Dropping {len(ids)} delete(s) in {chat_id}: past the 48h delete window")
+
+    # Retry queue
+    def _schedule_retry(self, bot, chat_id, ids, sent_at, attempt, error=None):
+        now = time.monotonic()
+        if isinstance(error, RetryAfter):
+            # Flood control sirf isi chat ko rokta hai; attempt count nahi hota
+            self._blocked[chat_id] = max(self._blocked.get(chat_id, 0), now + error.retry_after)
+        elif error is not None:
+            attempt += 1
+        blocked_until = self._blocked.get(chat_id, 0)
+        if blocked_until > now:
+            due = blocked_until + random.uniform(0, 1)
+        else:
+            self._blocked.pop(chat_id, None)
+            due = now + min(DELETE_RETRY_CAP, DELETE_RETRY_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+
+        if time.time() + (due - now) - sent_at > DELETE_MAX_AGE:
+            self._expired(chat_id, ids)
+            return
+        if self._retry_size + len(ids) > self.retry_limit:
+            DELETE_OUTCOMES.labels('dropped').inc(len(ids))
+            DELETE_RETRIES.labels('dropped').inc(len(ids))
+            logger.warning(f"Delete retry queue full, dropping {len(ids)} delete(s) in {chat_id}")
+            return
+
+        heapq.heappush(self._retry, (due, sent_at, next(self._seq), bot, chat_id, ids, attempt))
+        self._retry_size += len(ids)
+        DELETE_RETRY_QUEUE.set(self._retry_size)
+        DELETE_RETRIES.labels('scheduled').inc(len(ids))
+        logger.debug(f"Delete of {len(ids)} message(s) in {chat_id} retrying in {due - now:.1f}s ({error})")
+
+        if self._retry_task is None:
+            self._retry_task = asyncio.create_task(self._retry_worker())
+        self._retry_wakeup.set()
+
+    async def _retry_worker(self):
+        while True:
+            self._retry_wakeup.clear()
+            if not self._retry:
+                await self._retry_wakeup.wait()
+                continue
+            delay = self._retry[0][0] - time.monotonic()
+            if delay > 0:
+                # Beech me koi jaldi wala item aaye to jaag jao
+                try:
+                    await asyncio.wait_for(self._retry_wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, sent_at, _, bot, chat_id, ids, attempt = heapq.heappop(self._retry)
+            self._retry_size -= len(ids)
+            DELETE_RETRY_QUEUE.set(self._retry_size)
+            self._spawn(self._delete(bot, chat_id, ids, sent_at, attempt, retried=True))
+
+    async def flush_all(self, bot):
+        """Delete everything still buffered (used on shutdown)"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        pending, self._pending = self._pending, {}
+        sent_at, self._sent_at = self._sent_at, {}
+        await asyncio.gather(*(self._delete(bot, chat_id, ids, sent_at.get(chat_id, time.time()))
+                               for chat_id, ids in pending.items()),
+                             return_exceptions=True)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        # Retry wale items restart ke baad wapas nahi aate - gin ke chhod do
+        if self._retry_task is not None:
+            self._retry_task.cancel()
+            self._retry_task = None
+        if self._retry_size:
+            DELETE_OUTCOMES.labels('dropped').inc(self._retry_size)
+            logger.warning(f"Shutting down with {self._retry_size} delete(s) still waiting for retry")
+        self._retry.clear()
+        self._retry_size = 0
+        DELETE_RETRY_QUEUE.set(0)
+
+
+# Shared instance
+deleter = DeletionBuffer()
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import UPDATES_RECEIVED, UPDATES_IN_FLIGHT, update_type
+
+logger = logging.getLogger(__name__)
+
+# Kitne updates ek saath "in flight" ho sakte hain (chal rahe + apni chat ki baari ka wait)
+MAX_IN_FLIGHT = 10000
+
+
+def update_chat_id(update):
+    """Chat an update belongs to, or None for chat-less updates (inline queries etc.)"""
+    chat = getattr(update, 'effective_chat', None)
+    return chat.id if chat else None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates from different chats in parallel, one at a time per chat.
+
+    Har chat ka apna lock hai, isliye ek group ke updates usi order me
+    chalte hain jisme aaye. Concurrency cap chat lock milne ke baad lagta
+    hai, taaki ek busy chat ke queued updates baaki chats ke slots na ghere.
+    """
+
+    def __init__(self, max_concurrent_updates, catchup=None):
+        super().__init__(MAX_IN_FLIGHT)
+        self.concurrency = max_concurrent_updates
+        self.catchup = catchup
+        self._cap = asyncio.Semaphore(max_concurrent_updates)
+        self._chats = {}    # chat_id -> [lock, waiting count]
+
+    async def do_process_update(self, update, coroutine):
+        if hasattr(update, 'ALL_TYPES'):
+            UPDATES_RECEIVED.labels(update_type(update)).inc()
+        if self.catchup is not None and not self.catchup.admit(update):
+            # Backlog ka bekaar update - handler chalaye bina chhod do
+            coroutine.close()
+            self.catchup.done()
+            return
+        UPDATES_IN_FLIGHT.inc()
+        try:
+            await self._process(update, coroutine)
+        finally:
+            UPDATES_IN_FLIGHT.dec()
+            if self.catchup is not None:
+                self.catchup.done()
+
+    async def _process(self, update, coroutine):
+        chat_id = update_chat_id(update)
+        if chat_id is None:
+            async with self._cap:
+                await coroutine
+            return
+
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            entry = self._chats[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._cap:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[chat_id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
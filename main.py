@@ -1,28 +1,34 @@
+import time
+# Process start - startup phase timings isi se naape jaate hain
+_BOOT = time.monotonic()
 import os
 import logging
-import requests
 import asyncio
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
-import sqlite3
+from telegram import Update
+from telegram.error import BadRequest
+from telegram.ext import (Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler,
+                          ChatMemberHandler)
 from datetime import datetime
-from flask import Flask
-import threading
 import html
-
-# Flask app for Render/Heroku
-app = Flask(__name__)
-
-@app.route('/')
-def home():
-    return "🤖 Join Hider Bot is running!"
-
-@app.route('/health')
-def health():
-    return "OK", 200
-
-def run_flask():
-    app.run(host='0.0.0.0', port=8080, debug=False, threaded=True)
+import hashlib
+import signal
+import tempfile
+from storage import db, JOB_RUNNING, JOB_DONE, JOB_CANCELLED
+from registry import registry
+from broadcast import broadcast_jobs, JOB_LEASE
+from dispatch import ChatOrderedUpdateProcessor
+from deleter import deleter
+from web import WebServer
+from metrics import PENDING_UPDATES, WELCOME_LATENCY, DELETE_OUTCOMES, STARTUP_SECONDS
+from templates import Templates
+from membership import reconciler, is_live, membership_event, JOINED, RECONCILE_INTERVAL
+from permissions import permissions, can_delete_from
+from chat_settings import chat_settings, SETTING_KEYS
+from scheduler import outbound, BROADCAST, RequestShed
+from notifier import OwnerDigest, OWNER_DIGEST_INTERVAL
+from assets import welcome_asset, ANIMATION_URL
+from catchup import catchup
+from transfer import export_table, import_table, file_format, CSV, JSONL
 
 # Logging setup
 logging.basicConfig(
@@ -35,229 +41,245 @@ logger = logging.getLogger(__name__)
 BOT_TOKEN = os.environ.get("BOT_TOKEN", "")
 OWNER_ID = int(os.environ.get("OWNER_ID", 0))
 SUPPORT_CHANNEL = os.environ.get("SUPPORT_CHANNEL", "@idxhelp")
-ANIMATION_URL = os.environ.get("ANIMATION_URL", "https://files.catbox.moe/zvv7fa.gif")
-
-# Database setup
-def init_db():
-    conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS chats
-                (chat_id INTEGER PRIMARY KEY, chat_title TEXT, added_date TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS broadcast
-                (id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT, timestamp TEXT, 
-                broadcast_type TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                (user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT,
-                joined_date TEXT)''')
-    conn.commit()
-    conn.close()
-
-# Download GIF locally for better performance
-def download_animation():
+# Alag-alag chats ke kitne updates ek saath process ho sakte hain
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", 32))
+# Broadcast progress message kitne seconds me update ho
+BROADCAST_PROGRESS_INTERVAL = float(os.environ.get("BROADCAST_PROGRESS_INTERVAL", 15))
+# Web server (health routes + webhook) - Render PORT khud set karta hai
+PORT = int(os.environ.get("PORT", 8080))
+# WEBHOOK_URL set ho to webhook mode, warna polling
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "").rstrip('/')
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or hashlib.sha256(BOT_TOKEN.encode()).hexdigest()
+# Sirf wahi update types mangao jinke handlers hain (catch-up backlog bhi chhota rehta hai)
+ALLOWED_UPDATES = [Update.MESSAGE, Update.MY_CHAT_MEMBER, Update.CALLBACK_QUERY]
+
+# Managed Groups browser - ek page me kitni chats, aur search text ki max length
+# (callback_data 64 bytes tak hi ho sakta hai aur cursor bhi usi me jaata hai)
+CHATS_PAGE_SIZE = 50
+CHATS_SEARCH_MAX_BYTES = 32
+
+web_server = None
+# Precomputed texts/keyboards - post_init me bot username milte hi bante hain
+templates = None
+# Owner ke group add/remove notifications ka digest
+owner_digest = None
+
+# Startup phase timings - har phase ka apna time aur process start se total
+_last_phase = _BOOT
+
+def log_phase(phase):
+    global _last_phase
+    now = time.monotonic()
+    logger.info(f"⏱️ Startup phase '{phase}': {now - _last_phase:.2f}s (total {now - _BOOT:.2f}s)")
+    STARTUP_SECONDS.labels(phase).set(now - _BOOT)
+    _last_phase = now
+
+# Startup / shutdown hooks - shared DB connection aur registry bot ke event loop pe chalte hain
+async def post_init(application: Application):
+    global templates, owner_digest
+    log_phase('bot_init')
+    templates = Templates(SUPPORT_CHANNEL, application.bot.username, OWNER_ID)
+    owner_digest = OwnerDigest(OWNER_ID, templates)
+    PENDING_UPDATES.set_function(application.update_queue.qsize)
+    # GIF ka wait nahi - update loop pehle, asset background me
+    welcome_asset.start()
+    await web_server.start('0.0.0.0', PORT)
+    log_phase('web_server')
+    await db.open()
+    await registry.load()
+    registry.start()
+    await chat_settings.load()
+    log_phase('storage')
+    # Band rehne ke dauran aaye updates - drop nahi, tezi se drain
+    if await catchup.begin(application.bot):
+        application.job_queue.run_repeating(catchup.job, interval=catchup.idle, first=catchup.idle)
+    # Chupchaap kho gaye groups thode-thode karke dhoondo
+    application.job_queue.run_repeating(reconciler.job, interval=RECONCILE_INTERVAL, first=RECONCILE_INTERVAL)
+    if OWNER_DIGEST_INTERVAL > 0:
+        application.job_queue.run_repeating(owner_digest.job, interval=OWNER_DIGEST_INTERVAL,
+                                            first=OWNER_DIGEST_INTERVAL)
+    if db.shared:
+        # Doosre replicas ke settings toggles, aur unke chhode/mare hue broadcast jobs
+        application.job_queue.run_repeating(chat_settings.job, interval=chat_settings.refresh_interval,
+                                            first=chat_settings.refresh_interval)
+        application.job_queue.run_repeating(resume_broadcast_jobs_job, interval=JOB_LEASE, first=JOB_LEASE)
+    await resume_broadcast_jobs(application)
+    log_phase('ready')
+
+async def post_stop(application: Application):
+    # Running broadcasts ko rok do (finish nahi) - agle startup pe resume honge
+    broadcast_jobs.pause_all()
+    await asyncio.gather(*_broadcast_tasks, return_exceptions=True)
+    # Buffer me bache service messages bhi delete kar do
+    await deleter.flush_all(application.bot)
+    # Adhoora digest bhi bhej do
+    await owner_digest.flush(application.bot)
+
+async def post_shutdown(application: Application):
     try:
-        # GIF download karein
-        print(f"📥 Downloading GIF from environment variable...")
-        print(f"📥 URL: {ANIMATION_URL}")
+        await registry.stop()
+    except Exception as e:
+        logger.error(f"Registry shutdown flush error: {e}")
+    await db.close()
+    await web_server.stop()
+    await welcome_asset.stop()
+
+# Webhook mode - updates hamare apne web server pe aate hain, isi event loop pe
+async def run_webhook(application: Application):
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    await application.initialize()
+    try:
+        await post_init(application)
+        await application.start()
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=not catchup.enabled
+        )
+        print(f"✅ Webhook set: {WEBHOOK_URL}{WEBHOOK_PATH}")
         
-        if not ANIMATION_URL or ANIMATION_URL == "":
-            print("❌ No animation URL provided in environment variables")
-            return False
-            
+        await stop_event.wait()
+        print("\n👋 Bot stopping...")
+        await application.stop()
+        await post_stop(application)
+    finally:
+        await application.shutdown()
+        await post_shutdown(application)
+
+# Uploaded animation ka Telegram file_id cache - GIF sirf ek baar upload hota hai
+_asset_hashes = {}   # source -> (stat signature, content hash)
+_file_ids = {}       # content hash -> file_id
+# Sirf yahi BadRequest batate hain ki file_id hi kharab hai - baaki (rights, chat not found) pe cache rehta hai
+STALE_FILE_ID_ERRORS = ('wrong file identifier', 'file reference expired', 'wrong remote file identifier')
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def _asset_hash(source):
+    """Content hash of a local file (re-hashed only when it changes) or of a URL"""
+    if not os.path.exists(source):
+        return "url:" + hashlib.sha256(source.encode()).hexdigest()
+    st = os.stat(source)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _asset_hashes.get(source)
+    if cached and cached[0] == signature:
+        return cached[1]
+    asset_hash = "sha256:" + await asyncio.to_thread(_hash_file, source)
+    _asset_hashes[source] = (signature, asset_hash)
+    return asset_hash
+
+async def send_cached_animation(context, chat_id, source, **kwargs):
+    """Send an animation by cached file_id, uploading only when there is none or it is rejected"""
+    asset_hash = await _asset_hash(source)
+    file_id = _file_ids.get(asset_hash)
+    if file_id is None:
+        file_id = await db.get_file_id(asset_hash)
+    
+    if file_id:
         try:
-            if not os.path.exists('welcome.gif'):
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-                response = requests.get(ANIMATION_URL, timeout=30, stream=True, headers=headers)
-                if response.status_code == 200:
-                    with open('welcome.gif', 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                    print(f"✅ GIF downloaded successfully!")
-                    return True
-                else:
-                    print(f"❌ Failed to download: Status {response.status_code}")
-            else:
-                print("✅ GIF already exists!")
-                return True
-                
-        except Exception as e:
-            print(f"❌ Error downloading GIF: {e}")
-            
-        # Agar download fail ho to static image bana lein
-        if not os.path.exists('welcome.gif'):
-            print("⚠️ Creating fallback image...")
-            try:
-                # Simple static image create karein
-                from PIL import Image, ImageDraw, ImageFont
-                
-                img = Image.new('RGB', (400, 200), color='darkblue')
-                d = ImageDraw.Draw(img)
-                
-                # Try to add text
-                try:
-                    font = ImageFont.truetype("arial.ttf", 30)
-                except:
-                    font = ImageFont.load_default()
-                
-                d.text((100, 80), "🤖 Join Hider Bot", fill='white', font=font)
-                d.text((120, 120), "Welcome!", fill='yellow', font=font)
-                
-                img.save('welcome.gif')
-                print("✅ Created fallback image!")
-                return True
-            except Exception as e:
-                print(f"❌ Failed to create image: {e}")
-                return False
-        
-        return True
-    except Exception as e:
-        print(f"❌ Critical animation error: {e}")
-        return False
+            return await context.bot.send_animation(chat_id=chat_id, animation=file_id, **kwargs)
+        except BadRequest as e:
+            if not any(error in str(e).lower() for error in STALE_FILE_ID_ERRORS):
+                raise
+            logger.warning(f"Cached animation file_id rejected, re-uploading: {e}")
+            _file_ids.pop(asset_hash, None)
+            await db.delete_file_id(asset_hash)
+    
+    if os.path.exists(source):
+        with open(source, 'rb') as f:
+            message = await context.bot.send_animation(chat_id=chat_id, animation=f, **kwargs)
+    else:
+        message = await context.bot.send_animation(chat_id=chat_id, animation=source, **kwargs)
+    
+    media = message.animation or message.document
+    if media:
+        _file_ids[asset_hash] = media.file_id
+        await db.set_file_id(asset_hash, media.file_id)
+    return message
 
 # Combined welcome message with GIF and buttons
 async def send_welcome_message(chat_id, context, chat_title=None, user_name=None, is_group=False, user_id=None):
     """Send combined welcome message with GIF and buttons"""
+    started = time.monotonic()
     try:
-        # Welcome message text
+        return await _send_welcome_message(chat_id, context, chat_title, user_name, is_group, user_id)
+    finally:
+        WELCOME_LATENCY.observe(time.monotonic() - started)
+
+async def _send_welcome_message(chat_id, context, chat_title, user_name, is_group, user_id):
+    try:
+        # Welcome text/keyboard precomputed templates se - sirf naam bharna hai
         if is_group and chat_title:
-            welcome_text = f"""
-🎉 <b>Hello {html.escape(chat_title)}!</b>
-
-🤖 <b>I'm Join Hider Bot</b> - Your friendly group assistant!
-
-✅ <b>I will automatically hide all join/leave messages</b>
-✅ <b>No more spammy notifications</b>
-✅ <b>Clean chat experience</b>
-
-<b>To get started:</b>
-1️⃣ Make me admin in this group
-2️⃣ Grant me delete message permission
-3️⃣ I'll start working automatically!
-
-<b>Support:</b> {SUPPORT_CHANNEL}
-"""
-            # Group welcome buttons
-            keyboard = [
-                [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-                [InlineKeyboardButton("⚙️ Bot Settings", callback_data="group_settings"),
-                 InlineKeyboardButton("🆘 Help", callback_data="help")]
-            ]
-            
+            welcome_text = templates.group_welcome_text.format(chat_title=html.escape(chat_title))
+            reply_markup = templates.group_welcome_keyboard
         elif user_name:
-            # Check if user is owner
-            is_owner = (user_id == OWNER_ID)
-            
-            welcome_text = f"""
-🎉 <b>Welcome to Join Hider Bot!</b>
-
-Hello <b>{html.escape(user_name)}</b>! I will hide join/leave messages in your groups.
-
-<b>Features:</b>
-✅ Hide new member join messages
-✅ Hide member leave messages
-
-<b>Support Channel:</b> {SUPPORT_CHANNEL}
-"""
-            if is_owner:
-                welcome_text += "\n<b>👑 Owner Panel:</b> You have access to admin features!"
-            
             # Private chat buttons (different for owner and regular users)
-            if is_owner:
-                keyboard = [
-                    [InlineKeyboardButton("📊 Stats", callback_data="stats"),
-                     InlineKeyboardButton("📢 Broadcast", callback_data="broadcast_menu")],
-                    [InlineKeyboardButton("👥 Managed Groups", callback_data="chats"),
-                     InlineKeyboardButton("🆘 Help", callback_data="help")],
-                    [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-                    [InlineKeyboardButton("👥 Add to Group", url=f"https://t.me/{context.bot.username}?startgroup=true")]
-                ]
+            if user_id == OWNER_ID:
+                welcome_text = templates.owner_welcome_text.format(user_name=html.escape(user_name))
+                reply_markup = templates.owner_welcome_keyboard
             else:
-                keyboard = [
-                    [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-                    [InlineKeyboardButton("🆘 Help", callback_data="help"),
-                     InlineKeyboardButton("👥 Add to Group", url=f"https://t.me/{context.bot.username}?startgroup=true")]
-                ]
+                welcome_text = templates.user_welcome_text.format(user_name=html.escape(user_name))
+                reply_markup = templates.user_welcome_keyboard
         else:
-            welcome_text = f"""
-🎉 <b>Welcome to Join Hider Bot!</b>
-
-🤖 I will hide join/leave messages in your groups.
-
-<b>Features:</b>
-✅ Auto hide join/leave messages
-
-<b>Support:</b> {SUPPORT_CHANNEL}
-"""
-            keyboard = [
-                [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-                [InlineKeyboardButton("🆘 Help", callback_data="help")]
-            ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+            welcome_text = templates.default_welcome_text
+            reply_markup = templates.support_help_keyboard
         
         # Try to send GIF with caption and buttons
-        if os.path.exists('welcome.gif'):
-            try:
-                await context.bot.send_animation(
-                    chat_id=chat_id,
-                    animation=open('welcome.gif', 'rb'),
-                    caption=welcome_text,
-                    reply_markup=reply_markup,
-                    parse_mode='HTML'
-                )
-                return True
-            except Exception as e:
-                logger.error(f"GIF send error: {e}")
-                # Fallback: Send GIF and message separately
-                await context.bot.send_animation(
-                    chat_id=chat_id,
-                    animation=open('welcome.gif', 'rb')
-                )
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=welcome_text,
-                    reply_markup=reply_markup,
-                    parse_mode='HTML'
-                )
-                return True
-        else:
-            # Try to send from URL
-            try:
-                await context.bot.send_animation(
-                    chat_id=chat_id,
-                    animation=ANIMATION_URL,
-                    caption=welcome_text,
-                    reply_markup=reply_markup,
-                    parse_mode='HTML'
-                )
-                return True
-            except Exception as e:
-                logger.error(f"URL GIF error: {e}")
-                # Send only text with buttons
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=welcome_text,
-                    reply_markup=reply_markup,
-                    parse_mode='HTML'
-                )
-                return True
-                
+        # (GIF background me aa raha ho to tab tak URL se, URL bhi na ho to sirf text)
+        source = welcome_asset.source()
+        if source is None:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=welcome_text,
+                reply_markup=reply_markup,
+                parse_mode='HTML'
+            )
+            return True
+        try:
+            await send_cached_animation(
+                context,
+                chat_id,
+                source,
+                caption=welcome_text,
+                reply_markup=reply_markup,
+                parse_mode='HTML'
+            )
+            return True
+        except RequestShed:
+            raise
+        except Exception as e:
+            logger.error(f"GIF send error ({source}): {e}")
+            # Fallback: sirf text - GIF dobara bhejne se wahi error aur ek aur upload
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=welcome_text,
+                reply_markup=reply_markup,
+                parse_mode='HTML'
+            )
+            return True
+    
+    except RequestShed as e:
+        # Raid me welcome jaan-boojh kar chhoda gaya - fallbacks bhi shed hi honge
+        logger.debug(f"Welcome skipped: {e}")
+        return False
     except Exception as e:
         logger.error(f"Welcome message error: {e}")
         # Last resort: simple text with buttons
         try:
-            simple_keyboard = [
-                [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-                [InlineKeyboardButton("🆘 Help", callback_data="help")]
-            ]
-            simple_markup = InlineKeyboardMarkup(simple_keyboard)
-            
             await context.bot.send_message(
                 chat_id=chat_id,
-                text=f"🎉 Welcome to Join Hider Bot!\n\nSupport: {SUPPORT_CHANNEL}",
-                reply_markup=simple_markup
+                text=templates.fallback_welcome_text,
+                reply_markup=templates.support_help_keyboard
             )
             return True
         except:
@@ -271,14 +293,7 @@ async def start(update: Update, context: CallbackContext):
     
     # User ko database me save karein (only in private chat)
     if chat_type == 'private':
-        conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-        c = conn.cursor()
-        c.execute('''INSERT OR IGNORE INTO users
-                    (user_id, username, first_name, joined_date)
-                    VALUES (?, ?, ?, ?)''',
-                    (user_id, user.username, user.first_name, datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
+        registry.add_user(user_id, user.username, user.first_name)
     
     # Combined welcome message with GIF and buttons
     await send_welcome_message(
@@ -296,140 +311,144 @@ async def handle_group_events(update: Update, context: CallbackContext):
             chat = update.message.chat
             chat_id = chat.id
             chat_title = chat.title or "Group"
+            # Memory se - yahan kabhi DB query nahi
+            settings = chat_settings.get(chat_id)
             
             # Check for new chat members
             if update.message.new_chat_members:
-                bot_added = False
-                
-                # Check if bot is among new members
-                for member in update.message.new_chat_members:
-                    if member.id == context.bot.id:
-                        bot_added = True
-                        break
-                
-                if bot_added:
-                    # Bot was added to the group
-                    logger.info(f"🤖 Bot added to group: {chat_title} ({chat_id})")
-                    
-                    # Store group info in database
-                    conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-                    c = conn.cursor()
-                    c.execute("INSERT OR REPLACE INTO chats (chat_id, chat_title, added_date) VALUES (?, ?, ?)",
-                             (chat_id, chat_title, datetime.now().isoformat()))
-                    conn.commit()
-                    conn.close()
-                    
-                    # Send combined welcome message to group with buttons
-                    await send_welcome_message(
-                        chat_id=chat_id,
-                        context=context,
-                        chat_title=chat_title,
-                        is_group=True
-                    )
-                    
-                    # Notify owner
-                    if OWNER_ID:
-                        try:
-                            notify_keyboard = [
-                                [InlineKeyboardButton("👥 View Groups", callback_data="chats"),
-                                 InlineKeyboardButton("📊 Stats", callback_data="stats")]
-                            ]
-                            notify_markup = InlineKeyboardMarkup(notify_keyboard)
-                            
-                            await context.bot.send_message(
-                                chat_id=OWNER_ID,
-                                text=f"✅ <b>Bot added to new group!</b>\n\n"
-                                     f"<b>Group:</b> {html.escape(chat_title)}\n"
-                                     f"<b>ID:</b> <code>{chat_id}</code>\n"
-                                     f"<b>Date:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                                reply_markup=notify_markup,
-                                parse_mode='HTML'
-                            )
-                        except Exception as e:
-                            logger.error(f"Owner notification error: {e}")
-                
-                else:
-                    # Regular users joined - hide their join message
-                    try:
-                        await update.message.delete()
-                        logger.info(f"👥 Join message hidden in {chat_title}")
-                        
-                        # Ensure group is in database
-                        conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-                        c = conn.cursor()
-                        c.execute("INSERT OR IGNORE INTO chats (chat_id, chat_title, added_date) VALUES (?, ?, ?)",
-                                 (chat_id, chat_title, datetime.now().isoformat()))
-                        conn.commit()
-                        conn.close()
-                        
-                    except Exception as e:
-                        logger.error(f"Delete join message error: {e}")
+                # Bot khud add hua ho to my_chat_member handler sambhalta hai
+                if any(member.id == context.bot.id for member in update.message.new_chat_members):
+                    return
+                # Raid detection - burst me deletes ko baaki traffic se pehle jagah milti hai
+                outbound.note_joins(chat_id, len(update.message.new_chat_members))
+                kind, hide = "👥 Join", settings['join']
             
             # Check for left chat member
             elif update.message.left_chat_member:
-                # Don't delete if it's the bot leaving
-                if update.message.left_chat_member.id != context.bot.id:
-                    try:
-                        await update.message.delete()
-                        logger.info(f"👋 Leave message hidden in {chat_title}")
-                    except Exception as e:
-                        logger.error(f"Delete leave message error: {e}")
-                else:
-                    # Bot was removed from group
-                    logger.info(f"🤖 Bot removed from group: {chat_title} ({chat_id})")
-                    
-                    # Notify owner
-                    if OWNER_ID:
-                        try:
-                            await context.bot.send_message(
-                                chat_id=OWNER_ID,
-                                text=f"❌ <b>Bot removed from group!</b>\n\n"
-                                     f"<b>Group:</b> {html.escape(chat_title)}\n"
-                                     f"<b>ID:</b> <code>{chat_id}</code>\n"
-                                     f"<b>Date:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                                parse_mode='HTML'
-                            )
-                        except Exception as e:
-                            logger.error(f"Owner notification error: {e}")
+                # Don't delete if it's the bot leaving (my_chat_member handler sambhalta hai)
+                if update.message.left_chat_member.id == context.bot.id:
+                    return
+                kind, hide = "👋 Leave", settings['leave']
+            
+            # Pin, title/photo change, video chat waghera - sirf "all" mode me
+            else:
+                kind, hide = "📌 Service", False
+            
+            if (hide or settings['all']) and await hide_service_message(context, update.message):
+                logger.debug(f"{kind} message queued for deletion in {chat_title}")
+            
+            # Ensure group is in database (title badla ho ya inactive tha to bhi update)
+            registry.add_chat(chat_id, chat_title)
     
     except Exception as e:
         logger.error(f"Error in handle_group_events: {e}")
 
+async def hide_service_message(context, message):
+    """Queue a service message for deletion if the bot has delete rights in that chat"""
+    chat_id = message.chat.id
+    if await permissions.can_delete(context.bot, chat_id):
+        # Per-chat buffer me jaata hai, thodi der me bulk delete hoga
+        deleter.add(context.bot, chat_id, message.message_id, message.date.timestamp())
+        return True
+    
+    # Rights nahi - delete call fail hi hogi, admins ko kabhi-kabhi yaad dila do
+    DELETE_OUTCOMES.labels('skipped_no_rights').inc()
+    if permissions.should_hint(chat_id):
+        try:
+            await context.bot.send_message(chat_id=chat_id, text=templates.delete_rights_hint_text, parse_mode='HTML')
+        except Exception as e:
+            # Hint gaya hi nahi (raid me shed bhi) - agli baar phir try ho
+            permissions.hint_failed(chat_id)
+            logger.debug(f"Delete rights hint error in {chat_id}: {e}")
+    return False
+
+# Bot ki apni membership - add/remove/promote/demote sab my_chat_member update se
+async def handle_my_chat_member(update: Update, context: CallbackContext):
+    change = update.my_chat_member
+    chat = change.chat
+    old, new = change.old_chat_member, change.new_chat_member
+    was_live, now_live = is_live(old), is_live(new)
+    
+    if chat.type == 'private':
+        # Private chat me "kicked" = user ne bot block kiya
+        user = change.from_user
+        if not now_live:
+            registry.deactivate_user(user.id, 'blocked')
+        elif not was_live:
+            registry.add_user(user.id, user.username, user.first_name)
+        return
+    if chat.type not in ['group', 'supergroup']:
+        return
+    
+    chat_id = chat.id
+    chat_title = chat.title or "Group"
+    event = membership_event(old.status, was_live, new.status, now_live)
+    actor_id = change.from_user.id if change.from_user else None
+    registry.record_membership(chat_id, chat_title, event, old.status, new.status, now_live, actor_id)
+    if now_live:
+        permissions.set(chat_id, can_delete_from(new))
+    else:
+        permissions.forget(chat_id)
+    logger.info(f"🤖 Bot {event} in group: {chat_title} ({chat_id}) [{old.status} -> {new.status}]")
+    
+    if event == JOINED:
+        # Send combined welcome message to group with buttons
+        await send_welcome_message(
+            chat_id=chat_id,
+            context=context,
+            chat_title=chat_title,
+            is_group=True
+        )
+    
+    # Notify owner - digest me jama hota hai (OWNER_NOTIFY_IMMEDIATE wale turant)
+    await owner_digest.notify(context.bot, event, chat_id, chat_title)
+
 # Group settings callback
 async def group_settings_callback(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
-    
+    await show_group_settings(query)
+
+async def show_group_settings(query):
     chat = query.message.chat
     if chat.type in ['group', 'supergroup']:
-        settings_text = f"""
-<b>⚙️ Group Settings - {html.escape(chat.title)}</b>
+        settings = chat_settings.get(chat.id)
+        settings_text = templates.group_settings(html.escape(chat.title), chat.id, settings)
+        await query.message.edit_text(settings_text, reply_markup=templates.settings_keyboard(settings),
+                                      parse_mode='HTML')
 
-<b>Group ID:</b> <code>{chat.id}</code>
-
-<b>Bot Features:</b>
-✅ Join messages hidden
-✅ Leave messages hidden
-✅ Welcome messages enabled
-
-<b>Admin Commands:</b>
-/settings - Show this menu
-/start - Bot info
+async def is_chat_admin(bot, chat_id, user_id):
+    try:
+        member = await bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+    except Exception as e:
+        logger.error(f"Admin check error in {chat_id}: {e}")
+        return False
+    return member.status in ['administrator', 'creator']
 
-<b>Support:</b> {SUPPORT_CHANNEL}
-"""
-        
-        keyboard = [
-            [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-            [InlineKeyboardButton("🔙 Back", callback_data="back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.message.edit_text(settings_text, reply_markup=reply_markup, parse_mode='HTML')
+async def toggle_group_setting(query, context):
+    """set:<join|leave|all> - flip one setting (chat admins only)"""
+    chat = query.message.chat
+    key = query.data.split(':', 1)[1]
+    if chat.type not in ['group', 'supergroup'] or key not in SETTING_KEYS:
+        await query.answer()
+        return
+    if not await is_chat_admin(context.bot, chat.id, query.from_user.id):
+        await query.answer("❌ Only group admins can change settings!", show_alert=True)
+        return
+    
+    settings = await chat_settings.toggle(chat.id, key)
+    await query.answer("✅ Settings updated")
+    settings_text = templates.group_settings(html.escape(chat.title), chat.id, settings)
+    await query.message.edit_text(settings_text, reply_markup=templates.settings_keyboard(settings),
+                                  parse_mode='HTML')
 
 # Callback query handler
 async def button_handler(update: Update, context: CallbackContext):
     query = update.callback_query
+    # Settings toggles apna answer khud dete hain (non-admin ko alert)
+    if query.data and query.data.startswith("set:"):
+        await toggle_group_setting(query, context)
+        return
     await query.answer()
     user_id = query.from_user.id
     data = query.data
@@ -439,145 +458,52 @@ async def button_handler(update: Update, context: CallbackContext):
             await query.message.reply_text("❌ Only owner can view statistics!")
             return
         
-        conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM chats")
-        chat_count = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM users")
-        user_count = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM broadcast WHERE broadcast_type='groups'")
-        group_broadcast_count = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM broadcast WHERE broadcast_type='users'")
-        user_broadcast_count = c.fetchone()[0]
-        conn.close()
-        
-        stats_text = f"""
-<b>📊 Bot Statistics</b>
-
-<b>👥 Managed Groups:</b> {chat_count}
-<b>👤 Total Users:</b> {user_count}
-<b>📢 Group Broadcasts Sent:</b> {group_broadcast_count}
-<b>📢 User Broadcasts Sent:</b> {user_broadcast_count}
-
-<b>🆔 Owner ID:</b> {OWNER_ID}
-<b>🔧 Status:</b> ✅ Running
-<b>💡 Support:</b> {SUPPORT_CHANNEL}
-"""
-        keyboard = [
-            [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-            [InlineKeyboardButton("🔙 Back", callback_data="back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(stats_text, reply_markup=reply_markup, parse_mode='HTML')
+        stats = await db.get_stats()
+        stats_text = templates.stats_text.format(**stats)
+        await query.message.edit_text(stats_text, reply_markup=templates.support_back_keyboard, parse_mode='HTML')
     
     elif data == "chats":
         if user_id != OWNER_ID:
             await query.message.reply_text("❌ Only owner can view managed chats!")
             return
         
-        conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-        c = conn.cursor()
-        c.execute("SELECT chat_id, chat_title, added_date FROM chats ORDER BY added_date DESC")
-        chats = c.fetchall()
-        conn.close()
-        
-        if chats:
-            chat_list = "\n".join([f"• {html.escape(title)} (<code>{cid}</code>) - {added_date.split('T')[0]}" 
-                                  for cid, title, added_date in chats[:50]])
-            if len(chats) > 50:
-                chat_list += f"\n\n... and {len(chats)-50} more groups"
-            text = f"<b>👥 Managed Chats</b>\n\n{chat_list}"
-        else:
-            text = "❌ No chats managed yet.\nAdd me to a group and make me admin!"
+        text, keyboard = await render_chats_page()
+        await query.message.edit_text(text, reply_markup=keyboard, parse_mode='HTML')
+    
+    elif data.startswith("chats:"):
+        if user_id != OWNER_ID:
+            await query.message.reply_text("❌ Only owner can view managed chats!")
+            return
         
-        keyboard = [
-            [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-            [InlineKeyboardButton("🔙 Back", callback_data="back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(text, reply_markup=reply_markup, parse_mode='HTML')
+        # chats:<n|p>:<cursor chat_id>[:<search prefix>]
+        parts = data.split(':', 3)
+        prefix = parts[3] if len(parts) > 3 else None
+        text, keyboard = await render_chats_page(int(parts[2]), parts[1] == 'p', prefix)
+        try:
+            await query.message.edit_text(text, reply_markup=keyboard, parse_mode='HTML')
+        except BadRequest as e:
+            # Dobara same button dabane par "message is not modified"
+            logger.debug(f"Chats page edit error: {e}")
     
     elif data == "group_settings":
-        # Group settings callback
-        chat = query.message.chat
-        if chat.type in ['group', 'supergroup']:
-            settings_text = f"""
-<b>⚙️ Group Settings - {html.escape(chat.title)}</b>
-
-<b>Bot Features:</b>
-✅ Join messages hidden
-✅ Leave messages hidden
-✅ Welcome messages enabled
-
-<b>Commands:</b>
-/settings - Show settings
-/start - Bot info
-
-<b>Support:</b> {SUPPORT_CHANNEL}
-"""
-            keyboard = [
-                [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-                [InlineKeyboardButton("🔙 Back", callback_data="back")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.message.edit_text(settings_text, reply_markup=reply_markup, parse_mode='HTML')
+        await show_group_settings(query)
     
     elif data == "gbroadcast_menu":
         if user_id != OWNER_ID:
             await query.message.reply_text("❌ Only owner can broadcast messages!")
             return
         
-        await query.message.edit_text(
-            f"<b>📢 Broadcast to Groups</b>\n\n"
-            f"Please use command:\n"
-            f"<code>/gbroadcast your_message_here</code>\n\n"
-            f"<b>Example:</b>\n"
-            f"<code>/gbroadcast Hello groups! New update available.</code>\n\n"
-            f"<b>Support Channel:</b> {SUPPORT_CHANNEL}",
-            parse_mode='HTML'
-        )
+        await query.message.edit_text(templates.gbroadcast_menu_text, parse_mode='HTML')
     
     elif data == "broadcast_menu":
         if user_id != OWNER_ID:
             await query.message.reply_text("❌ Only owner can broadcast messages!")
             return
         
-        await query.message.edit_text(
-            f"<b>📢 Broadcast to Users</b>\n\n"
-            f"Please use command:\n"
-            f"<code>/broadcast your_message_here</code>\n\n"
-            f"<b>Example:</b>\n"
-            f"<code>/broadcast Hello users! Check out new features.</code>\n\n"
-            f"<b>Support Channel:</b> {SUPPORT_CHANNEL}",
-            parse_mode='HTML'
-        )
+        await query.message.edit_text(templates.broadcast_menu_text, parse_mode='HTML')
     
     elif data == "help":
-        help_text = f"""
-<b>🆘 Help Guide</b>
-
-<b>How to use this bot:</b>
-1. Add me to your group
-2. Make me admin with delete permissions
-3. I'll automatically hide join/leave messages
-
-<b>Owner Commands:</b>
-/start - Bot menu
-/stats - View statistics
-
-<b>Support:</b>
-If you need help, join our support channel: {SUPPORT_CHANNEL}
-
-<b>Features:</b>
-• Auto hide join messages
-• Auto hide leave messages
-"""
-        keyboard = [
-            [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-            [InlineKeyboardButton("🔙 Back", callback_data="back")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(help_text, reply_markup=reply_markup, parse_mode='HTML')
+        await query.message.edit_text(templates.help_text, reply_markup=templates.support_back_keyboard, parse_mode='HTML')
     
     elif data == "back":
         # Send welcome message again
@@ -595,15 +521,134 @@ If you need help, join our support channel: {SUPPORT_CHANNEL}
         except:
             pass
 
-# Broadcast commands (same as before)
+async def render_chats_page(cursor=None, backwards=False, prefix=None):
+    """Text and keyboard for one Managed Groups page (keyset paginated)"""
+    rows, has_prev, has_next = await db.chats_page(cursor, backwards, prefix, CHATS_PAGE_SIZE)
+    if not rows:
+        if prefix is None:
+            return templates.no_chats_text, templates.support_back_keyboard
+        return templates.no_chat_matches_text.format(query=html.escape(prefix)), templates.support_back_keyboard
+    
+    chat_list = "\n".join(templates.chat_line.format(title=html.escape(title or ''), chat_id=cid,
+                                                     added=(added_date or '').split('T')[0])
+                          for cid, title, added_date in rows)
+    if prefix is None:
+        text = templates.chats_text.format(chat_list=chat_list)
+    else:
+        text = templates.chats_search_text.format(query=html.escape(prefix), chat_list=chat_list)
+    
+    # Cursor = page ki pehli/aakhri chat ka ID
+    suffix = f":{prefix}" if prefix is not None else ""
+    keyboard = templates.chats_keyboard(
+        prev_data=f"chats:p:{rows[0][0]}{suffix}" if has_prev else None,
+        next_data=f"chats:n:{rows[-1][0]}{suffix}" if has_next else None,
+    )
+    return text + templates.chats_footer, keyboard
+
+# Broadcast jobs - DB me persist hote hain, restart ke baad wahin se resume
+_broadcast_tasks = set()
+
+async def report_broadcast_progress(bot, job_id):
+    """Keep editing the job's progress message while it runs"""
+    last_text = None
+    while True:
+        await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+        job = await broadcast_jobs.progress(job_id)
+        if not job or not job['notify_chat_id']:
+            continue
+        progress = job['progress']
+        done = job['total'] - progress.get('pending', 0)
+        text = (
+            f"🔄 Broadcasting... (job #{job_id})\n\n"
+            f"Progress: {done}/{job['total']}\n"
+            f"✅ {progress.get('sent', 0)} • ❌ {progress.get('failed', 0) + progress.get('permanent', 0)}"
+        )
+        if text == last_text:
+            continue
+        try:
+            await bot.edit_message_text(chat_id=job['notify_chat_id'], message_id=job['notify_message_id'], text=text,
+                                        rate_limit_args=BROADCAST)
+            last_text = text
+        except Exception as e:
+            logger.debug(f"Broadcast progress edit error: {e}")
+
+async def supervise_broadcast(bot, job_id, max_restarts=3):
+    """Run a job in the background, restarting it (from pending recipients) if it crashes"""
+    for attempt in range(max_restarts + 1):
+        try:
+            await run_broadcast_job(bot, job_id)
+            return
+        except Exception as e:
+            logger.error(f"Broadcast job #{job_id} crashed (attempt {attempt + 1}): {e}")
+            # Restart ka wait - beech me shutdown aa jaye to dobara start mat karo
+            try:
+                await asyncio.wait_for(broadcast_jobs.stopping.wait(), 10 * (attempt + 1))
+            except asyncio.TimeoutError:
+                continue
+            logger.info(f"Broadcast job #{job_id} not restarted: shutting down")
+            return
+    logger.error(f"Broadcast job #{job_id} gave up after {max_restarts} restarts")
+
+def start_broadcast(bot, job_id):
+    task = asyncio.create_task(supervise_broadcast(bot, job_id), name=f"broadcast-job-{job_id}")
+    _broadcast_tasks.add(task)
+    task.add_done_callback(_broadcast_tasks.discard)
+    return task
+
+async def run_broadcast_job(bot, job_id):
+    """Run a broadcast job and put its final result into the job's progress message"""
+    progress_task = asyncio.create_task(report_broadcast_progress(bot, job_id))
+    try:
+        job = await broadcast_jobs.run(job_id, bot)
+    finally:
+        progress_task.cancel()
+    if not job or job['status'] == JOB_RUNNING:
+        # Shutdown ki wajah se ruka - agle startup pe resume hoga
+        return
+    
+    progress = job['progress']
+    target = "Groups" if job['broadcast_type'] == "groups" else "Users"
+    title = "✅ Broadcast Complete" if job['status'] == JOB_DONE else "🛑 Broadcast Cancelled"
+    text = (
+        f"<b>{title}</b> (job #{job_id})\n\n"
+        f"<b>Total {target}:</b> {job['total']}\n"
+        f"<b>Successful:</b> {progress.get('sent', 0)}\n"
+        f"<b>Failed:</b> {progress.get('failed', 0) + progress.get('permanent', 0)} "
+        f"(permanent: {progress.get('permanent', 0)})\n"
+        f"<b>Not sent:</b> {progress.get('pending', 0)}\n\n"
+        f"💡 Support: {SUPPORT_CHANNEL}"
+    )
+    try:
+        await bot.edit_message_text(
+            chat_id=job['notify_chat_id'],
+            message_id=job['notify_message_id'],
+            text=text,
+            parse_mode='HTML'
+        )
+    except Exception as e:
+        logger.error(f"Broadcast report error for job #{job_id}: {e}")
+
+async def resume_broadcast_jobs(application: Application):
+    # Sirf wahi jobs jinhe koi aur replica nahi bhej raha (claim run() me hota hai)
+    for job in await broadcast_jobs.resumable():
+        logger.info(f"📢 Resuming broadcast job #{job['id']} ({job['broadcast_type']})")
+        start_broadcast(application.bot, job['id'])
+
+async def resume_broadcast_jobs_job(context: CallbackContext):
+    """job_queue callback - takes over jobs whose replica stopped or died"""
+    if broadcast_jobs.stopping.is_set():
+        return
+    try:
+        await resume_broadcast_jobs(context.application)
+    except Exception as e:
+        logger.error(f"Broadcast resume error: {e}")
+
+# Broadcast commands
 async def gbroadcast_command(update: Update, context: CallbackContext):
     user_id = update.effective_user.id
     
     if user_id != OWNER_ID:
-        await update.message.reply_text(
-            f"❌ Only owner can use this command.\n\n"
-            f"💡 Support: {SUPPORT_CHANNEL}"
-        )
+        await update.message.reply_text(templates.owner_only_text)
         return
     
     if not context.args:
@@ -617,61 +662,29 @@ async def gbroadcast_command(update: Update, context: CallbackContext):
     
     message = " ".join(context.args)
     
-    conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("SELECT chat_id, chat_title FROM chats")
-    chats = c.fetchall()
-    conn.close()
+    # Queued registry rows pehle DB me likh do taaki koi naya recipient na chhoote
+    await registry.flush()
+    job_id, total = await broadcast_jobs.create(message, "groups")
     
-    if not chats:
+    if not total:
+        await db.finish_job(job_id, JOB_CANCELLED)
         await update.message.reply_text("❌ No groups found to broadcast!")
         return
     
-    success = 0
-    failed = 0
-    
     processing_msg = await update.message.reply_text(
-        f"🔄 Broadcasting to {len(chats)} groups...\n"
+        f"🔄 Broadcasting to {total} groups... (job #{job_id})\n"
         f"Please wait..."
     )
+    await db.set_job_message(job_id, processing_msg.chat_id, processing_msg.message_id)
     
-    for chat_id, chat_title in chats:
-        try:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=f"{html.escape(message)}",
-                parse_mode='HTML'
-            )
-            success += 1
-            await asyncio.sleep(0.5)
-        except Exception as e:
-            logger.error(f"Broadcast failed for {chat_title} ({chat_id}): {e}")
-            failed += 1
-    
-    conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("INSERT INTO broadcast (message, timestamp, broadcast_type) VALUES (?, ?, ?)",
-              (message, datetime.now().isoformat(), "groups"))
-    conn.commit()
-    conn.close()
-    
-    await processing_msg.edit_text(
-        f"<b>✅ Broadcast Complete</b>\n\n"
-        f"<b>Total Groups:</b> {len(chats)}\n"
-        f"<b>Successful:</b> {success}\n"
-        f"<b>Failed:</b> {failed}\n\n"
-        f"💡 Support: {SUPPORT_CHANNEL}",
-        parse_mode='HTML'
-    )
+    # Background me chalega - handler turant free, join/leave deletion nahi rukta
+    start_broadcast(context.bot, job_id)
 
 async def broadcast_command(update: Update, context: CallbackContext):
     user_id = update.effective_user.id
     
     if user_id != OWNER_ID:
-        await update.message.reply_text(
-            f"❌ Only owner can use this command.\n\n"
-            f"💡 Support: {SUPPORT_CHANNEL}"
-        )
+        await update.message.reply_text(templates.owner_only_text)
         return
     
     if not context.args:
@@ -685,115 +698,207 @@ async def broadcast_command(update: Update, context: CallbackContext):
     
     message = " ".join(context.args)
     
-    conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("SELECT user_id, username FROM users")
-    users = c.fetchall()
-    conn.close()
+    # Queued registry rows pehle DB me likh do taaki koi naya recipient na chhoote
+    await registry.flush()
+    job_id, total = await broadcast_jobs.create(message, "users")
     
-    if not users:
+    if not total:
+        await db.finish_job(job_id, JOB_CANCELLED)
         await update.message.reply_text("❌ No users found to broadcast!")
         return
     
-    success = 0
-    failed = 0
-    
     processing_msg = await update.message.reply_text(
-        f"🔄 Broadcasting to {len(users)} users...\n"
+        f"🔄 Broadcasting to {total} users... (job #{job_id})\n"
         f"Please wait..."
     )
+    await db.set_job_message(job_id, processing_msg.chat_id, processing_msg.message_id)
+    
+    # Background me chalega - handler turant free, join/leave deletion nahi rukta
+    start_broadcast(context.bot, job_id)
+
+async def chats_command(update: Update, context: CallbackContext):
+    if update.effective_user.id != OWNER_ID:
+        await update.message.reply_text(templates.owner_only_text)
+        return
+    
+    # /chats - newest groups, /chats <title> - title prefix search
+    prefix = " ".join(context.args) if context.args else None
+    if prefix and len(prefix.encode()) > CHATS_SEARCH_MAX_BYTES:
+        await update.message.reply_text(templates.chats_search_too_long_text.format(limit=CHATS_SEARCH_MAX_BYTES))
+        return
+    
+    text, keyboard = await render_chats_page(prefix=prefix)
+    await update.message.reply_text(text, reply_markup=keyboard, parse_mode='HTML')
+
+async def bjobs_command(update: Update, context: CallbackContext):
+    if update.effective_user.id != OWNER_ID:
+        await update.message.reply_text(templates.owner_only_text)
+        return
     
-    for user_id, username in users:
+    # /bjobs <id> - ek job ki detail, warna recent jobs ki list
+    if context.args:
         try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"{html.escape(message)}",
-                parse_mode='HTML'
-            )
-            success += 1
-            await asyncio.sleep(0.3)
-        except Exception as e:
-            logger.error(f"Broadcast failed for user {username} ({user_id}): {e}")
-            failed += 1
-    
-    conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-    c = conn.cursor()
-    c.execute("INSERT INTO broadcast (message, timestamp, broadcast_type) VALUES (?, ?, ?)",
-              (message, datetime.now().isoformat(), "users"))
-    conn.commit()
-    conn.close()
-    
-    await processing_msg.edit_text(
-        f"<b>✅ Broadcast Complete</b>\n\n"
-        f"<b>Total Users:</b> {len(users)}\n"
-        f"<b>Successful:</b> {success}\n"
-        f"<b>Failed:</b> {failed}\n\n"
-        f"💡 Support: {SUPPORT_CHANNEL}",
+            job = await broadcast_jobs.progress(int(context.args[0]))
+        except ValueError:
+            job = None
+        if not job:
+            await update.message.reply_text("❌ Job not found!")
+            return
+        jobs = [job]
+    else:
+        jobs = [await broadcast_jobs.progress(job['id']) for job in await db.list_jobs()]
+    
+    if not jobs:
+        await update.message.reply_text("ℹ️ No broadcast jobs yet.")
+        return
+    
+    lines = []
+    for job in jobs:
+        progress = job['progress']
+        done = job['total'] - progress.get('pending', 0)
+        lines.append(
+            f"<b>#{job['id']}</b> {job['broadcast_type']} - {job['status']}\n"
+            f"   {done}/{job['total']} done • ✅ {progress.get('sent', 0)} • "
+            f"❌ {progress.get('failed', 0) + progress.get('permanent', 0)}"
+        )
+    await update.message.reply_text(
+        f"<b>📢 Broadcast Jobs</b>\n\n" + "\n".join(lines) + "\n\nCancel: <code>/bcancel job_id</code>",
         parse_mode='HTML'
     )
 
+async def bcancel_command(update: Update, context: CallbackContext):
+    if update.effective_user.id != OWNER_ID:
+        await update.message.reply_text(templates.owner_only_text)
+        return
+    
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text(
+            "<b>📢 Usage:</b> /bcancel job_id\n\nSee /bjobs for job IDs.",
+            parse_mode='HTML'
+        )
+        return
+    
+    job_id = int(context.args[0])
+    if await broadcast_jobs.cancel(job_id):
+        await update.message.reply_text(f"🛑 Broadcast job #{job_id} cancelled.")
+    else:
+        await update.message.reply_text(f"❌ Job #{job_id} is not running.")
+
 # Other commands
 async def stats_command(update: Update, context: CallbackContext):
     user_id = update.effective_user.id
     
     if user_id == OWNER_ID:
-        conn = sqlite3.connect('bot_data.db', check_same_thread=False)
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM chats")
-        chat_count = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM users")
-        user_count = c.fetchone()[0]
-        conn.close()
-        
-        await update.message.reply_text(
-            f"<b>📊 Statistics</b>\n\n"
-            f"• <b>Managed Groups:</b> {chat_count}\n"
-            f"• <b>Total Users:</b> {user_count}\n"
-            f"• <b>Support:</b> {SUPPORT_CHANNEL}",
-            parse_mode='HTML'
-        )
+        stats = await db.get_stats()
+        await update.message.reply_text(templates.stats_command_text.format(**stats), parse_mode='HTML')
     else:
-        await update.message.reply_text(
-            f"❌ Only owner can view statistics.\n\n"
-            f"💡 Support: {SUPPORT_CHANNEL}"
+        await update.message.reply_text(templates.owner_only_stats_text)
+
+async def dbcheck_command(update: Update, context: CallbackContext):
+    if update.effective_user.id != OWNER_ID:
+        await update.message.reply_text(templates.owner_only_text)
+        return
+    
+    # Har hot statement ka query plan - full scan / temp sort wale upar
+    report = await db.check()
+    problems = [(name, lines) for name, _, lines in report['plans'] if lines]
+    text = (
+        f"<b>🗄️ Database check</b>\n\n"
+        f"Schema: v{report['version']} • page {report['page_size']} • {report['journal_mode']}\n"
+        f"Statements: {len(report['plans'])} • ⚠️ {len(problems)} unindexed\n"
+    )
+    for name, lines in problems:
+        text += f"\n⚠️ <code>{html.escape(name)}</code>\n" + "\n".join(f"   {html.escape(line)}" for line in lines)
+    if not problems:
+        text += "\n✅ Every hot statement uses an index."
+    await update.message.reply_text(text, parse_mode='HTML')
+
+# /export chats|users [csv] - gzip file stream hoti hai, poori table memory me nahi aati
+async def export_command(update: Update, context: CallbackContext):
+    if update.effective_user.id != OWNER_ID:
+        await update.message.reply_text(templates.owner_only_text)
+        return
+    
+    args = [arg.lower() for arg in context.args]
+    if not args or args[0] not in ('chats', 'users'):
+        await update.message.reply_text(templates.export_usage_text)
+        return
+    table = args[0]
+    fmt = CSV if 'csv' in args[1:] else JSONL
+    
+    processing_msg = await update.message.reply_text(templates.exporting_text.format(table=table))
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}.gz")
+    os.close(fd)
+    try:
+        count = await export_table(db, table, path, fmt)
+        with open(path, 'rb') as f:
+            await update.message.reply_document(
+                document=f,
+                filename=f"{table}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}.gz",
+                caption=templates.export_caption.format(count=count, table=table, fmt=fmt)
+            )
+        await processing_msg.delete()
+    except Exception as e:
+        logger.error(f"Export error: {e}")
+        await processing_msg.edit_text(templates.export_failed_text.format(error=html.escape(str(e))),
+                                       parse_mode='HTML')
+    finally:
+        os.remove(path)
+
+# /import chats|users - export file (jsonl/csv, gzip ya plain) pe reply karke
+async def import_command(update: Update, context: CallbackContext):
+    if update.effective_user.id != OWNER_ID:
+        await update.message.reply_text(templates.owner_only_text)
+        return
+    
+    args = [arg.lower() for arg in context.args]
+    replied = update.message.reply_to_message
+    document = replied.document if replied else None
+    if not args or args[0] not in ('chats', 'users') or document is None:
+        await update.message.reply_text(templates.import_usage_text)
+        return
+    table = args[0]
+    fmt = file_format(document.file_name)
+    
+    processing_msg = await update.message.reply_text(templates.importing_text.format(table=table))
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        file = await context.bot.get_file(document.file_id)
+        await file.download_to_drive(path)
+        inserted, present, invalid = await import_table(db, table, path, fmt)
+        # Registry ka known-set naye rows ke saath dobara
+        await registry.flush()
+        await registry.load()
+        await processing_msg.edit_text(
+            templates.import_done_text.format(table=table, fmt=fmt, inserted=inserted, present=present,
+                                              invalid=invalid),
+            parse_mode='HTML'
         )
+    except Exception as e:
+        logger.error(f"Import error: {e}")
+        await processing_msg.edit_text(templates.import_failed_text.format(error=html.escape(str(e))),
+                                       parse_mode='HTML')
+    finally:
+        os.remove(path)
 
 async def settings(update: Update, context: CallbackContext):
     chat = update.effective_chat
     
     if chat.type in ['group', 'supergroup']:
-        # Group settings with buttons
-        settings_text = f"""
-<b>⚙️ Group Settings - {html.escape(chat.title)}</b>
-
-<b>Group ID:</b> <code>{chat.id}</code>
-
-<b>Bot Features:</b>
-✅ Join messages hidden
-✅ Leave messages hidden
-✅ Welcome messages enabled
-
-<b>Support:</b> {SUPPORT_CHANNEL}
-"""
-        keyboard = [
-            [InlineKeyboardButton("📢 Support Channel", url=f"https://t.me/{SUPPORT_CHANNEL[1:]}")],
-            [InlineKeyboardButton("🆘 Help", callback_data="help")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(settings_text, reply_markup=reply_markup, parse_mode='HTML')
+        # Group settings with toggle buttons
+        settings = chat_settings.get(chat.id)
+        settings_text = templates.group_settings(html.escape(chat.title), chat.id, settings)
+        await update.message.reply_text(settings_text, reply_markup=templates.settings_keyboard(settings),
+                                        parse_mode='HTML')
     else:
-        await update.message.reply_text(
-            f"ℹ️ This command works only in groups!\n\n"
-            f"Add me to a group and make me admin to use this feature.\n\n"
-            f"<b>Support:</b> {SUPPORT_CHANNEL}",
-            parse_mode='HTML'
-        )
+        await update.message.reply_text(templates.settings_private_text, parse_mode='HTML')
 
 async def error_handler(update: Update, context: CallbackContext):
     logger.error(f"Error: {context.error}")
 
 def main():
+    log_phase('imports')
     # Bot token check
     if not BOT_TOKEN:
         print("❌ ERROR: BOT_TOKEN environment variable not set!")
@@ -805,71 +910,84 @@ def main():
     
     # Check animation URL
     if not ANIMATION_URL or ANIMATION_URL == "":
-        print("⚠️ WARNING: ANIMATION_URL not set. Using default URL.")
-    
-    # Download GIF
-    download_animation()
-    
-    # Initialize database
-    init_db()
-    
-    # Start Flask server
-    try:
-        flask_thread = threading.Thread(target=run_flask, daemon=True)
-        flask_thread.start()
-        print("🌐 Flask server started on port 8080")
-    except Exception as e:
-        print(f"⚠️ Flask server error: {e}")
+        print("⚠️ WARNING: ANIMATION_URL not set. Welcome will use the fallback image.")
     
     # Create bot application
     print("🔄 Creating bot application...")
     
-    # Pehle webhook delete karein
-    try:
-        import telegram
-        bot = telegram.Bot(token=BOT_TOKEN)
-        bot.delete_webhook()
-        print("✅ Webhook deleted (if any)")
-    except Exception as e:
-        print(f"⚠️ Webhook deletion error: {e}")
-    
-    # Application create karein
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Application create karein - polling mode me run_polling khud purana webhook hata deta hai
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY, catchup))
+        # Saari outgoing requests priority scheduler se (deletes sabse pehle)
+        .rate_limiter(outbound)
+    )
+    if WEBHOOK_URL:
+        # Webhook mode me Updater ki zarurat nahi
+        builder = builder.updater(None)
+    application = builder.build()
+    
+    # Web server - health routes hamesha, webhook route sirf webhook mode me
+    global web_server
+    web_server = WebServer(
+        application,
+        webhook_path=WEBHOOK_PATH if WEBHOOK_URL else None,
+        secret_token=WEBHOOK_SECRET
+    )
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("chats", chats_command))
     application.add_handler(CommandHandler("gbroadcast", gbroadcast_command))
     application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("bjobs", bjobs_command))
+    application.add_handler(CommandHandler("bcancel", bcancel_command))
+    application.add_handler(CommandHandler("dbcheck", dbcheck_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("import", import_command))
     application.add_handler(CommandHandler("settings", settings))
     
-    # Group events handler
+    # Group events handler - saare service messages; kaun chupe ye chat settings tay karti hain
     application.add_handler(MessageHandler(
-        filters.StatusUpdate.NEW_CHAT_MEMBERS | filters.StatusUpdate.LEFT_CHAT_MEMBER,
+        filters.ChatType.GROUPS & filters.StatusUpdate.ALL & ~filters.StatusUpdate.MIGRATE,
         handle_group_events
     ))
     
+    # Bot ki apni membership changes
+    application.add_handler(ChatMemberHandler(handle_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
+    
     # Callback query handler (including group_settings)
     application.add_handler(CallbackQueryHandler(button_handler))
     
     # Error handler
     application.add_error_handler(error_handler)
+    log_phase('build')
     
     # Start bot
     print("🤖 Bot starting...")
     print(f"📢 Support Channel: {SUPPORT_CHANNEL}")
     print(f"👤 Owner ID: {OWNER_ID}")
     print(f"🎥 Animation URL: {ANIMATION_URL}")
-    print(f"🎥 GIF File: {'Available' if os.path.exists('welcome.gif') else 'Not available'}")
+    print(f"🎥 GIF File: {'Available' if welcome_asset.ready else 'Fetching in background'}")
+    print(f"🔌 Mode: {'Webhook' if WEBHOOK_URL else 'Polling'}")
+    print(f"📬 Catch-up: {'On' if catchup.enabled else 'Off (pending updates dropped)'}")
     print("✅ Ready to receive updates...")
     
     # Run bot
     try:
-        application.run_polling(
-            drop_pending_updates=True,
-            allowed_updates=Update.ALL_TYPES,
-            close_loop=False
-        )
+        if WEBHOOK_URL:
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling(
+                drop_pending_updates=not catchup.enabled,
+                allowed_updates=ALLOWED_UPDATES,
+                close_loop=False
+            )
     except KeyboardInterrupt:
         print("\n👋 Bot stopped by user")
     except Exception as e:
@@ -0,0 +1,106 @@
+import os
+import logging
+
+from telegram import ChatMember
+
+from storage import db
+from registry import registry
+from broadcast import inactive_reason
+
+logger = logging.getLogger(__name__)
+
+# Har reconcile tick me kitni live chats check hon, aur kitne seconds me ek tick
+RECONCILE_BATCH = int(os.environ.get("RECONCILE_BATCH", 20))
+RECONCILE_INTERVAL = float(os.environ.get("RECONCILE_INTERVAL", 60))
+
+# Membership events
+JOINED = 'joined'
+REMOVED = 'removed'
+PROMOTED = 'promoted'
+DEMOTED = 'demoted'
+UPDATED = 'updated'
+LOST = 'lost'
+
+LIVE_STATUSES = (ChatMember.OWNER, ChatMember.ADMINISTRATOR, ChatMember.MEMBER, ChatMember.RESTRICTED)
+
+
+def is_live(member):
+    """True if this ChatMember means the bot is (still) in the chat"""
+    if member.status == ChatMember.RESTRICTED:
+        return member.is_member
+    return member.status in LIVE_STATUSES
+
+
+def membership_event(old_status, was_live, new_status, now_live):
+    """Classify a bot status change as joined / removed / promoted / demoted / updated"""
+    if not now_live:
+        return REMOVED
+    if not was_live:
+        return JOINED
+    if new_status == ChatMember.ADMINISTRATOR and old_status != ChatMember.ADMINISTRATOR:
+        return PROMOTED
+    if old_status == ChatMember.ADMINISTRATOR and new_status != ChatMember.ADMINISTRATOR:
+        return DEMOTED
+    return UPDATED
+
+
+class MembershipReconciler:
+    """Finds chats the bot silently lost, a small batch at a time.
+
+    Har tick sirf RECONCILE_BATCH live chats (sabse purane verified pehle,
+    index se) ka getChatMember check hota hai - full table scan kabhi nahi.
+    Jo chat ab reachable nahi, wo "lost" event ke saath inactive ho jaati hai.
+    """
+
+    def __init__(self, storage, registry, batch_size=RECONCILE_BATCH):
+        self.storage = storage
+        self.registry = registry
+        self.batch_size = batch_size
+
+    async def run_once(self, bot):
+        """Check one batch; returns how many chats were found lost"""
+        # Pending state pehle DB me, warna abhi-abhi removed chats dobara check hongi
+        await self.registry.flush()
+        rows = await self.storage.chats_to_verify(self.batch_size)
+        verified = []
+        lost = 0
+        for chat_id, chat_title, status in rows:
+            try:
+                member = await bot.get_chat_member(chat_id=chat_id, user_id=bot.id)
+            except Exception as e:
+                reason = inactive_reason(e)
+                if reason is None:
+                    # Network/flood waghera - status wahi rakho par verified_at aage badhao,
+                    # warna ye chats har tick queue ke aage atki rahengi
+                    logger.debug(f"Reconcile check failed for {chat_id}: {e}")
+                    verified.append((status, chat_id))
+                    continue
+                self.registry.record_membership(chat_id, chat_title, LOST, status, reason, live=False)
+                lost += 1
+                continue
+
+            now_live = is_live(member)
+            # status None = purana row, pehli baar check - event nahi, sirf status bharo
+            if now_live and status in (member.status, None):
+                verified.append((member.status, chat_id))
+            else:
+                event = LOST if not now_live else membership_event(status, True, member.status, True)
+                self.registry.record_membership(chat_id, chat_title, event, status, member.status, now_live)
+                lost += not now_live
+
+        if verified:
+            await self.storage.set_verified(verified)
+        if lost:
+            logger.info(f"🔍 Reconcile: {lost}/{len(rows)} checked chats were lost")
+        return lost
+
+    async def job(self, context):
+        """job_queue callback"""
+        try:
+            await self.run_once(context.bot)
+        except Exception as e:
+            logger.error(f"Membership reconcile error: {e}")
+
+
+# Shared instance
+reconciler = MembershipReconciler(db, registry)
@@ -0,0 +1,78 @@
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from telegram.error import RetryAfter, Forbidden, BadRequest
+
+# Hot paths ke liye latency buckets (seconds)
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+API_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+UPDATES_RECEIVED = Counter(
+    'joinhider_updates_received_total', 'Updates received, by update type', ['type'])
+PENDING_UPDATES = Gauge(
+    'joinhider_pending_updates', 'Updates waiting in the application update queue')
+UPDATES_IN_FLIGHT = Gauge(
+    'joinhider_updates_in_flight', 'Updates being processed or waiting for their chat')
+
+DELETE_LATENCY = Histogram(
+    'joinhider_delete_seconds', 'Service-message delete call latency', ['method'], buckets=API_BUCKETS)
+DELETE_OUTCOMES = Counter(
+    'joinhider_deleted_messages_total', 'Service messages by delete outcome', ['outcome'])
+DELETE_RETRIES = Counter(
+    'joinhider_delete_retries_total', 'Service-message delete retries by outcome', ['outcome'])
+DELETE_RETRY_QUEUE = Gauge(
+    'joinhider_delete_retry_queue', 'Service messages waiting in the delete retry queue')
+
+WELCOME_LATENCY = Histogram(
+    'joinhider_welcome_seconds', 'Welcome message send latency', buckets=API_BUCKETS)
+
+BROADCAST_MESSAGES = Counter(
+    'joinhider_broadcast_messages_total', 'Broadcast deliveries by outcome', ['outcome'])
+BROADCAST_THROTTLED = Counter(
+    'joinhider_broadcast_retry_after_total', 'RetryAfter responses received while broadcasting')
+OUTBOUND_WAIT = Histogram(
+    'joinhider_outbound_wait_seconds', 'Time a Bot API request waited for a slot, by priority class',
+    ['priority'], buckets=FAST_BUCKETS)
+OUTBOUND_SHED = Counter(
+    'joinhider_outbound_shed_total', 'Low-priority requests dropped during a join raid', ['endpoint'])
+OUTBOUND_RETRY_AFTER = Counter(
+    'joinhider_outbound_retry_after_total', 'RetryAfter responses seen by the outbound limiter, by bucket',
+    ['scope'])
+RAIDS_ACTIVE = Gauge(
+    'joinhider_raids_active', 'Chats currently in join-raid mode')
+
+CATCHUP_UPDATES = Gauge(
+    'joinhider_catchup_updates', 'Updates handled by the last startup catch-up', ['result'])
+CATCHUP_SECONDS = Gauge(
+    'joinhider_catchup_seconds', 'Duration of the last startup catch-up')
+STARTUP_SECONDS = Gauge(
+    'joinhider_startup_seconds', 'Seconds from process start to the end of each startup phase', ['phase'])
+
+DB_LATENCY = Histogram(
+    'joinhider_db_seconds', 'SQLite statement latency (worker thread time)', ['op'], buckets=FAST_BUCKETS)
+
+
+def update_type(update):
+    """Name of the field that is set on an Update (message, callback_query, ...)"""
+    for kind in update.ALL_TYPES:
+        if getattr(update, kind, None) is not None:
+            return kind
+    return 'unknown'
+
+
+def delete_outcome(error):
+    """Map a delete error to a metrics label"""
+    if error is None:
+        return 'ok'
+    if isinstance(error, RetryAfter):
+        return 'retry_after'
+    message = str(error).lower()
+    if 'not found' in message:
+        return 'not_found'
+    if isinstance(error, Forbidden) or (isinstance(error, BadRequest) and (
+            "can't be deleted" in message or 'rights' in message)):
+        return 'no_permission'
+    return 'error'
+
+
+def render():
+    """Body and content type for the /metrics endpoint"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,89 @@
+import os
+import html
+import time
+import logging
+from collections import deque
+from datetime import datetime
+
+from membership import JOINED, REMOVED
+
+logger = logging.getLogger(__name__)
+
+# Owner ko group add/remove ka digest kitne seconds me ek baar (0 = har event turant)
+OWNER_DIGEST_INTERVAL = float(os.environ.get("OWNER_DIGEST_INTERVAL", 3600))
+# Digest me kitne latest groups ke naam
+OWNER_DIGEST_TOP = int(os.environ.get("OWNER_DIGEST_TOP", 10))
+# In events ka notification digest ka wait kiye bina turant (comma separated, e.g. "removed")
+OWNER_NOTIFY_IMMEDIATE = {e.strip() for e in os.environ.get("OWNER_NOTIFY_IMMEDIATE", "").split(",") if e.strip()}
+
+
+class OwnerDigest:
+    """Buffers group add/remove notifications for the owner and sends them as a digest.
+
+    Har event ek message nahi - counts aur latest groups jama hote hain aur
+    job_queue har interval pe ek hi message bhejta hai. OWNER_NOTIFY_IMMEDIATE
+    wale events (ya interval 0) turant purane format me jaate hain.
+    """
+
+    def __init__(self, owner_id, templates, interval=OWNER_DIGEST_INTERVAL, top=OWNER_DIGEST_TOP,
+                 immediate=OWNER_NOTIFY_IMMEDIATE):
+        self.owner_id = owner_id
+        self.templates = templates
+        self.interval = interval
+        self.immediate = immediate
+        self._counts = {JOINED: 0, REMOVED: 0}
+        self._latest = deque(maxlen=top)     # (event, chat_title, chat_id)
+        self._since = time.monotonic()
+
+    async def notify(self, bot, event, chat_id, chat_title):
+        if not self.owner_id or event not in self._counts:
+            return
+        if event in self.immediate or self.interval <= 0:
+            await self._send_single(bot, event, chat_id, chat_title)
+            return
+        self._counts[event] += 1
+        self._latest.append((event, chat_title, chat_id))
+
+    async def _send_single(self, bot, event, chat_id, chat_title):
+        text = self.templates.bot_added_text if event == JOINED else self.templates.bot_removed_text
+        try:
+            await bot.send_message(
+                chat_id=self.owner_id,
+                text=text.format(
+                    chat_title=html.escape(chat_title),
+                    chat_id=chat_id,
+                    date=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                ),
+                reply_markup=self.templates.owner_notify_keyboard if event == JOINED else None,
+                parse_mode='HTML'
+            )
+        except Exception as e:
+            logger.error(f"Owner notification error: {e}")
+
+    async def flush(self, bot):
+        """Send the digest for everything buffered since the last flush"""
+        total = sum(self._counts.values())
+        if not total:
+            self._since = time.monotonic()
+            return
+        counts, self._counts = self._counts, {JOINED: 0, REMOVED: 0}
+        latest, self._latest = list(self._latest), deque(maxlen=self._latest.maxlen)
+        minutes = max(1, round((time.monotonic() - self._since) / 60))
+        self._since = time.monotonic()
+
+        lines = "\n".join(self.templates.digest_line.format(
+            mark="✅" if event == JOINED else "❌", title=html.escape(title), chat_id=chat_id)
+            for event, title, chat_id in reversed(latest))
+        if total > len(latest):
+            lines += f"\n... and {total - len(latest)} more"
+        text = self.templates.owner_digest_text.format(
+            minutes=minutes, added=counts[JOINED], removed=counts[REMOVED], lines=lines)
+        try:
+            await bot.send_message(chat_id=self.owner_id, text=text,
+                                   reply_markup=self.templates.owner_notify_keyboard, parse_mode='HTML')
+        except Exception as e:
+            logger.error(f"Owner digest error: {e}")
+
+    async def job(self, context):
+        """job_queue callback"""
+        await self.flush(context.bot)
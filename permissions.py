@@ -0,0 +1,100 @@
+import os
+import time
+import asyncio
+import logging
+
+from telegram import ChatMember
+from telegram.error import Forbidden, BadRequest
+
+logger = logging.getLogger(__name__)
+
+# Bot ke admin rights kitni der tak cache rahein (my_chat_member aate hi turant update)
+PERMISSION_TTL = float(os.environ.get("PERMISSION_TTL", 3600))
+# Ek chat me "mujhe delete permission do" hint kitne seconds me max ek baar
+PERMISSION_HINT_INTERVAL = float(os.environ.get("PERMISSION_HINT_INTERVAL", 86400))
+
+
+def can_delete_from(member):
+    """can_delete_messages for the bot's own ChatMember"""
+    if member.status == ChatMember.OWNER:
+        return True
+    if member.status == ChatMember.ADMINISTRATOR:
+        return bool(member.can_delete_messages)
+    return False
+
+
+class PermissionCache:
+    """Per-chat cache of whether the bot can delete messages.
+
+    my_chat_member updates isse turant bharte hain; cache miss ya TTL
+    khatam hone par getChatMember se lazily pata chalta hai (ek chat ka
+    ek hi lookup, chahe kitne updates wait kar rahe hon). Rights nahi hain
+    to service messages skip hote hain - bekaar delete calls nahi.
+    """
+
+    def __init__(self, ttl=PERMISSION_TTL, hint_interval=PERMISSION_HINT_INTERVAL):
+        self.ttl = ttl
+        self.hint_interval = hint_interval
+        self._rights = {}       # chat_id -> (can_delete, expires_at)
+        self._lookups = {}      # chat_id -> in-flight getChatMember future
+        self._hinted = {}       # chat_id -> last hint time
+        self._hint_previous = {}    # chat_id -> hint se pehle wala time (fail hone par wapas)
+
+    def set(self, chat_id, can_delete):
+        self._rights[chat_id] = (can_delete, time.monotonic() + self.ttl)
+        if can_delete:
+            self._hinted.pop(chat_id, None)
+
+    def forget(self, chat_id):
+        """Drop the cached value; the next check asks Telegram again"""
+        self._rights.pop(chat_id, None)
+
+    async def can_delete(self, bot, chat_id):
+        cached = self._rights.get(chat_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        lookup = self._lookups.get(chat_id)
+        if lookup is None:
+            lookup = self._lookups[chat_id] = asyncio.ensure_future(self._lookup(bot, chat_id))
+            lookup.add_done_callback(lambda _: self._lookups.pop(chat_id, None))
+        return await asyncio.shield(lookup)
+
+    async def _lookup(self, bot, chat_id):
+        try:
+            member = await bot.get_chat_member(chat_id=chat_id, user_id=bot.id)
+        except (Forbidden, BadRequest) as e:
+            # Bot chat me hi nahi - delete bhi nahi ho sakta
+            logger.debug(f"Permission lookup failed in {chat_id}: {e}")
+            self.set(chat_id, False)
+            return False
+        except Exception as e:
+            # Network waghera - cache mat karo, delete try hone do
+            logger.debug(f"Permission lookup error in {chat_id}: {e}")
+            return True
+        can_delete = can_delete_from(member)
+        self.set(chat_id, can_delete)
+        return can_delete
+
+    def should_hint(self, chat_id):
+        """True at most once per hint_interval per chat (reserves the slot; see hint_failed)"""
+        now = time.monotonic()
+        last = self._hinted.get(chat_id)
+        if last is not None and now - last < self.hint_interval:
+            return False
+        # Abhi hi mark - ek saath aaye service messages do hint na bhejein
+        self._hinted[chat_id] = now
+        self._hint_previous[chat_id] = last
+        return True
+
+    def hint_failed(self, chat_id):
+        """Undo should_hint after the hint could not be sent"""
+        last = self._hint_previous.pop(chat_id, None)
+        if last is None:
+            self._hinted.pop(chat_id, None)
+        else:
+            self._hinted[chat_id] = last
+
+
+# Shared instance
+permissions = PermissionCache()
@@ -0,0 +1,209 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+
+from storage import (db, SQL_INSERT_CHAT, SQL_REPLACE_CHAT, SQL_UPDATE_CHAT_TITLE, SQL_INSERT_USER,
+                     SQL_SET_CHAT_ACTIVE, SQL_SET_USER_ACTIVE, SQL_SET_BOT_STATUS,
+                     SQL_INSERT_MEMBERSHIP_EVENT)
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.environ.get("REGISTRY_FLUSH_INTERVAL", 5))
+FLUSH_SIZE = int(os.environ.get("REGISTRY_FLUSH_SIZE", 200))
+
+
+class Registry:
+    """In-memory known-set of chats and users with write-behind flushing.
+
+    "Already known?" ka jawab memory se milta hai. Naye ya badle hue rows
+    queue me jaate hain aur timer ya size threshold pe ek transaction me
+    SQLite me flush hote hain.
+
+    Broadcast me permanently fail hue chats/users inactive mark hote hain;
+    wahi chat ya user dobara bot se interact kare to apne aap active.
+    """
+
+    def __init__(self, storage, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._chats = {}            # chat_id -> chat_title
+        self._users = set()
+        self._inactive_chats = set()
+        self._inactive_users = set()
+        self._pending_chats = {}    # chat_id -> (sql, row)
+        self._pending_users = {}    # user_id -> row
+        self._pending_chat_state = {}   # chat_id -> (active, reason, since, chat_id)
+        self._pending_user_state = {}   # user_id -> (active, reason, since, user_id)
+        self._pending_bot_status = {}   # chat_id -> (status, verified_at, chat_id)
+        self._pending_events = []       # membership_events rows
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._timer_task = None
+
+    async def load(self):
+        chats, users = await self.storage.load_known_ids()
+        self._chats = {chat_id: title for chat_id, title, _ in chats}
+        self._users = {user_id for user_id, _ in users}
+        self._inactive_chats = {chat_id for chat_id, _, active in chats if not active}
+        self._inactive_users = {user_id for user_id, active in users if not active}
+        logger.info(f"📇 Registry loaded: {len(self._chats)} chats, {len(self._users)} users "
+                    f"({len(self._inactive_chats)} / {len(self._inactive_users)} inactive)")
+
+    def start(self):
+        if self._timer_task is None:
+            self._timer_task = asyncio.create_task(self._timer())
+
+    async def stop(self):
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            try:
+                await self._timer_task
+            except asyncio.CancelledError:
+                pass
+            self._timer_task = None
+        await self.flush()
+
+    @property
+    def pending(self):
+        return (len(self._pending_chats) + len(self._pending_users)
+                + len(self._pending_chat_state) + len(self._pending_user_state)
+                + len(self._pending_bot_status) + len(self._pending_events))
+
+    def add_chat(self, chat_id, chat_title, replace=False):
+        """Queue a chat row; returns True if anything had to be written"""
+        now = datetime.now().isoformat()
+        reactivated = self._reactivate(chat_id, self._inactive_chats, self._pending_chat_state)
+        if replace:
+            # Nayi row default se active hai - queued state update usse overwrite na kare
+            self._pending_chat_state.pop(chat_id, None)
+            self._pending_chats[chat_id] = (SQL_REPLACE_CHAT, (chat_id, chat_title, now))
+        elif chat_id not in self._chats:
+            self._pending_chats[chat_id] = (SQL_INSERT_CHAT, (chat_id, chat_title, now))
+        elif self._chats[chat_id] != chat_title:
+            # Pehle se queued insert ho to usi ka title update karo
+            queued = self._pending_chats.get(chat_id)
+            if queued and queued[0] != SQL_UPDATE_CHAT_TITLE:
+                sql, row = queued
+                self._pending_chats[chat_id] = (sql, (chat_id, chat_title, row[2]))
+            else:
+                self._pending_chats[chat_id] = (SQL_UPDATE_CHAT_TITLE, (chat_title, chat_id))
+        else:
+            if reactivated:
+                self._maybe_flush()
+            return reactivated
+        self._chats[chat_id] = chat_title
+        self._maybe_flush()
+        return True
+
+    def add_user(self, user_id, username, first_name):
+        """Queue a user row; returns True if the user is new"""
+        if user_id in self._users:
+            if self._reactivate(user_id, self._inactive_users, self._pending_user_state):
+                self._maybe_flush()
+            return False
+        self._users.add(user_id)
+        self._pending_users[user_id] = (user_id, username, first_name, datetime.now().isoformat())
+        self._maybe_flush()
+        return True
+
+    def record_membership(self, chat_id, chat_title, event, old_status, new_status, live, actor_id=None):
+        """Queue a bot membership change: history row plus the chat's current state"""
+        now = datetime.now().isoformat()
+        if event == 'joined':
+            self.add_chat(chat_id, chat_title, replace=True)
+        elif chat_id not in self._chats:
+            # Jis chat ka row hi nahi tha - pehle row, phir uska state
+            self.add_chat(chat_id, chat_title)
+        if live:
+            self._reactivate(chat_id, self._inactive_chats, self._pending_chat_state)
+        else:
+            self._deactivate(chat_id, new_status, self._inactive_chats, self._pending_chat_state)
+        self._pending_bot_status[chat_id] = (new_status, now, chat_id)
+        self._pending_events.append((chat_id, chat_title, event, old_status, new_status, actor_id, now))
+        self._maybe_flush()
+
+    def deactivate_chat(self, chat_id, reason):
+        """Drop a chat from future broadcasts (bot kicked, chat deleted, ...)"""
+        self._deactivate(chat_id, reason, self._inactive_chats, self._pending_chat_state)
+
+    def deactivate_user(self, user_id, reason):
+        """Drop a user from future broadcasts (blocked the bot, account deleted, ...)"""
+        self._deactivate(user_id, reason, self._inactive_users, self._pending_user_state)
+
+    def _deactivate(self, key, reason, inactive, pending):
+        if key in inactive:
+            return
+        inactive.add(key)
+        pending[key] = (0, reason, datetime.now().isoformat(), key)
+        logger.info(f"💤 {key} marked inactive ({reason})")
+        self._maybe_flush()
+
+    @staticmethod
+    def _reactivate(key, inactive, pending):
+        if key not in inactive:
+            return False
+        inactive.discard(key)
+        pending[key] = (1, None, None, key)
+        logger.info(f"🔔 {key} is active again")
+        return True
+
+    def _maybe_flush(self):
+        if self.pending >= self.flush_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def _timer(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Registry flush error: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            chats, self._pending_chats = self._pending_chats, {}
+            users, self._pending_users = self._pending_users, {}
+            chat_state, self._pending_chat_state = self._pending_chat_state, {}
+            user_state, self._pending_user_state = self._pending_user_state, {}
+            bot_status, self._pending_bot_status = self._pending_bot_status, {}
+            events, self._pending_events = self._pending_events, []
+
+            # Statement order: replace/insert pehle, title updates baad me
+            grouped = {SQL_REPLACE_CHAT: [], SQL_INSERT_CHAT: [], SQL_UPDATE_CHAT_TITLE: []}
+            for sql, row in chats.values():
+                grouped[sql].append(row)
+            # Active/inactive updates sabse aakhir me, taaki naye inserted rows pe bhi lagein
+            batch = list(grouped.items()) + [
+                (SQL_INSERT_USER, list(users.values())),
+                (SQL_SET_CHAT_ACTIVE, list(chat_state.values())),
+                (SQL_SET_USER_ACTIVE, list(user_state.values())),
+                (SQL_SET_BOT_STATUS, list(bot_status.values())),
+                (SQL_INSERT_MEMBERSHIP_EVENT, events),
+            ]
+
+            try:
+                await self.storage.write_batch(batch)
+            except Exception:
+                # Fail hone par rows wapas queue me - naye changes ko overwrite kiye bina
+                for chat_id, item in chats.items():
+                    self._pending_chats.setdefault(chat_id, item)
+                for user_id, row in users.items():
+                    self._pending_users.setdefault(user_id, row)
+                for chat_id, row in chat_state.items():
+                    self._pending_chat_state.setdefault(chat_id, row)
+                for user_id, row in user_state.items():
+                    self._pending_user_state.setdefault(user_id, row)
+                for chat_id, row in bot_status.items():
+                    self._pending_bot_status.setdefault(chat_id, row)
+                self._pending_events[:0] = events
+                raise
+            logger.debug(f"Registry flushed {len(chats)} chats, {len(users)} users, "
+                         f"{len(chat_state) + len(user_state)} state changes, {len(events)} membership events")
+
+
+# Shared instance
+registry = Registry(db)
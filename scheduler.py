@@ -0,0 +1,323 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import OrderedDict, deque
+
+from telegram.error import TelegramError, RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import OUTBOUND_WAIT, OUTBOUND_SHED, OUTBOUND_RETRY_AFTER, RAIDS_ACTIVE
+
+logger = logging.getLogger(__name__)
+
+# Ek saath kitni Bot API requests chal sakti hain; baaki priority order me wait karti hain
+OUTBOUND_CONCURRENCY = int(os.environ.get("OUTBOUND_CONCURRENCY", 16))
+# Raid: RAID_WINDOW seconds me RAID_JOINS ya zyada joins; aakhri burst ke RAID_COOLDOWN baad khatam
+RAID_JOINS = int(os.environ.get("RAID_JOINS", 10))
+RAID_WINDOW = float(os.environ.get("RAID_WINDOW", 10))
+RAID_COOLDOWN = float(os.environ.get("RAID_COOLDOWN", 60))
+# Telegram limits - poore bot ke ~30 msg/s, private chat me ~1 msg/s, group me 20 msg/min
+OUTBOUND_GLOBAL_RATE = float(os.environ.get("OUTBOUND_GLOBAL_RATE", 30))
+OUTBOUND_CHAT_RATE = float(os.environ.get("OUTBOUND_CHAT_RATE", 1))
+OUTBOUND_GROUP_PER_MINUTE = float(os.environ.get("OUTBOUND_GROUP_PER_MINUTE", 20))
+# Group me itne messages ek saath; refill (limit - burst)/min, taaki kisi bhi minute me limit paar na ho
+OUTBOUND_GROUP_BURST = float(os.environ.get("OUTBOUND_GROUP_BURST", 3))
+# RetryAfter aane par bucket pause karke request kitni baar khud dobara bheji jaaye
+OUTBOUND_RETRY_AFTER_RETRIES = int(os.environ.get("OUTBOUND_RETRY_AFTER_RETRIES", 2))
+# Itne se zyada chat buckets hon to bhare hue (idle) buckets hata do
+CHAT_BUCKETS_MAX = 10000
+
+# Priority classes - chhota number pehle
+DELETE = 0
+CALLBACK = 1
+NOTIFY = 2
+BROADCAST = 3
+PRIORITY_NAMES = {DELETE: 'delete', CALLBACK: 'callback', NOTIFY: 'notify', BROADCAST: 'broadcast'}
+
+# rate_limit_args na diya ho to endpoint se priority
+ENDPOINT_PRIORITY = {
+    'deleteMessage': DELETE,
+    'deleteMessages': DELETE,
+    # Permission lookups deletes ko gate karte hain
+    'getChatMember': DELETE,
+    'answerCallbackQuery': CALLBACK,
+    'editMessageText': CALLBACK,
+    'editMessageReplyMarkup': CALLBACK,
+}
+
+# Ye endpoints message bhejte/badalte hain - inhi pe Telegram ke per-chat aur global limits lagte hain
+SEND_ENDPOINTS = {
+    'sendMessage', 'sendAnimation', 'sendPhoto', 'sendVideo', 'sendDocument', 'sendSticker',
+    'sendMediaGroup', 'copyMessage', 'forwardMessage',
+    'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup', 'editMessageMedia',
+}
+
+
+class Bucket:
+    """Token bucket that can be paused by a RetryAfter"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = None        # per-chat waiters ki line (pehli zarurat pe banta hai)
+
+    def take(self):
+        """Take a token; returns 0 on success or the seconds to wait for one"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        # Pause ke baad burst na aaye
+        self.tokens = 0
+
+    def idle(self):
+        now = time.monotonic()
+        return (now >= self.paused_until and (self.lock is None or not self.lock.locked())
+                and self.tokens + (now - self.updated) * self.rate >= self.capacity)
+
+
+class RequestShed(TelegramError):
+    """Raised instead of sending a low-priority request to a chat under a join raid"""
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Outbound request scheduler: Telegram rate limits, priority slots and join-raid detection.
+
+    Har Bot API call ek slot leti hai; slots bhare hon to waiters priority
+    order me milte hain (delete > callback > notify/welcome > broadcast).
+    Kisi chat me joins ka burst aaye to wo chat raid mode me jaati hai:
+    us chat ke notify-class sends shed hote hain aur broadcasts raid khatam
+    hone tak ruk jaate hain, taaki deletes ko poori capacity mile.
+
+    Message bhejne wali calls pehle apni chat ka bucket (private 1/s, group
+    20/min) aur phir global bucket (30/s) leti hain. Global tokens priority
+    order me, aur ek priority ke andar chats me baari-baari (round robin)
+    baante jaate hain - ek busy chat baaki chats ko nahi rokti. RetryAfter
+    us chat ka bucket (chat na ho ya broadcast ho to global bhi) pause karta
+    hai aur request khud dobara jaati hai, isliye call sites ko kuch nahi
+    karna padta. Deletes aur broadcasts ko 429 seedha milta hai - unki apni
+    retry logic hai.
+    """
+
+    def __init__(self, concurrency=OUTBOUND_CONCURRENCY, raid_joins=RAID_JOINS, raid_window=RAID_WINDOW,
+                 raid_cooldown=RAID_COOLDOWN, global_rate=OUTBOUND_GLOBAL_RATE, chat_rate=OUTBOUND_CHAT_RATE,
+                 group_per_minute=OUTBOUND_GROUP_PER_MINUTE, group_burst=OUTBOUND_GROUP_BURST,
+                 retry_after_retries=OUTBOUND_RETRY_AFTER_RETRIES):
+        self.concurrency = concurrency
+        self.raid_joins = raid_joins
+        self.raid_window = raid_window
+        self.raid_cooldown = raid_cooldown
+        self.chat_rate = chat_rate
+        self.group_rate = max(group_per_minute - group_burst, 1) / 60
+        self.group_burst = group_burst
+        self.retry_after_retries = retry_after_retries
+        self._active = 0
+        self._waiters = []      # (priority, seq, future) ka heap
+        self._seq = itertools.count()
+        self._joins = {}        # chat_id -> [window_start, count]
+        self._raids = {}        # chat_id -> raid khatam hone ka monotonic time
+        self._global = Bucket(global_rate, global_rate)
+        self._chat_buckets = {}     # chat_id -> Bucket
+        self._global_waiters = {}   # priority -> OrderedDict(chat_id -> deque of futures)
+        self._global_task = None
+        RAIDS_ACTIVE.set_function(lambda: len(self.active_raids()))
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    # Raid detection
+    def note_joins(self, chat_id, count=1):
+        """Record joins in a chat; returns True if the chat is (now) under a raid"""
+        now = time.monotonic()
+        window = self._joins.get(chat_id)
+        if window is None or now - window[0] > self.raid_window:
+            window = self._joins[chat_id] = [now, 0]
+        window[1] += count
+        if window[1] >= self.raid_joins:
+            if not self.in_raid(chat_id):
+                logger.warning(f"🚨 Join raid detected in {chat_id}: {window[1]} joins in {self.raid_window:.0f}s")
+            self._raids[chat_id] = now + self.raid_cooldown
+            return True
+        return self.in_raid(chat_id)
+
+    def in_raid(self, chat_id):
+        until = self._raids.get(chat_id)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._raids[chat_id]
+            self._joins.pop(chat_id, None)
+            logger.info(f"✅ Join raid over in {chat_id}")
+            return False
+        return True
+
+    def active_raids(self):
+        return [chat_id for chat_id in list(self._raids) if self.in_raid(chat_id)]
+
+    # Scheduling
+    @staticmethod
+    def priority_of(endpoint, rate_limit_args):
+        if isinstance(rate_limit_args, int):
+            return rate_limit_args
+        return ENDPOINT_PRIORITY.get(endpoint, NOTIFY)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = self.priority_of(endpoint, rate_limit_args)
+        started = time.monotonic()
+        chat_id = data.get('chat_id') if data else None
+
+        if priority == NOTIFY and chat_id is not None and self.in_raid(chat_id):
+            # Raid ke dauran welcome/hint jaise sends us chat me nahi
+            OUTBOUND_SHED.labels(endpoint).inc()
+            raise RequestShed(f"{endpoint} to {chat_id} shed during a join raid")
+        if priority == BROADCAST:
+            # Raid chal rahi ho to broadcast traffic baad me
+            while True:
+                raids = self.active_raids()
+                if not raids:
+                    break
+                await asyncio.sleep(max(self._raids[chat_id] for chat_id in raids) - time.monotonic())
+
+        # Deletes ka RetryAfter deleter ki apni retry queue, broadcasts ka BroadcastEngine
+        # sambhalta hai (uska bucket bhi rukna chahiye) - dono ko 429 seedha milta hai
+        retries = 0 if priority in (DELETE, BROADCAST) else self.retry_after_retries
+        limited = endpoint in SEND_ENDPOINTS
+        while True:
+            if limited:
+                if chat_id is not None:
+                    await self._take_chat(chat_id)
+                await self._take_global(priority, chat_id)
+            await self._acquire(priority)
+            OUTBOUND_WAIT.labels(PRIORITY_NAMES.get(priority, 'other')).observe(time.monotonic() - started)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                # Flood control sahi bucket pe - chat ka ho to sirf wo chat rukti hai.
+                # Broadcast me bahut chats ko ek ek message jaata hai, wahan 429 bot-wide
+                # limit ka hota hai - global bhi rukta hai
+                scope = 'global' if chat_id is None or priority == BROADCAST else 'chat'
+                OUTBOUND_RETRY_AFTER.labels(scope).inc()
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).pause(e.retry_after)
+                if scope == 'global':
+                    self._global.pause(e.retry_after)
+                if retries <= 0 or not limited:
+                    raise
+                retries -= 1
+                logger.warning(f"{endpoint} to {chat_id} throttled, retrying in {e.retry_after}s")
+            finally:
+                self._release()
+
+    # Rate limits
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= CHAT_BUCKETS_MAX:
+                self._chat_buckets = {key: b for key, b in self._chat_buckets.items() if not b.idle()}
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = Bucket(self.chat_rate, 1)
+            else:
+                # Groups/channels (negative IDs ya @username)
+                bucket = Bucket(self.group_rate, self.group_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _take_chat(self, chat_id):
+        bucket = self._chat_bucket(chat_id)
+        if bucket.lock is None:
+            bucket.lock = asyncio.Lock()
+        # Ek chat ke sends apni line me, usi order me jisme aaye
+        async with bucket.lock:
+            while True:
+                delay = bucket.take()
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+
+    async def _take_global(self, priority, chat_id):
+        if not self._global_waiters and not self._global.take():
+            return
+        future = asyncio.get_running_loop().create_future()
+        chats = self._global_waiters.setdefault(priority, OrderedDict())
+        chats.setdefault(chat_id, deque()).append(future)
+        if self._global_task is None:
+            self._global_task = asyncio.create_task(self._hand_out_global())
+        await future
+
+    def _next_global_waiter(self):
+        # Sabse important priority, uske andar chats me round robin
+        while self._global_waiters:
+            priority = min(self._global_waiters)
+            chats = self._global_waiters[priority]
+            chat_id, futures = next(iter(chats.items()))
+            future = futures.popleft()
+            if futures:
+                chats.move_to_end(chat_id)
+            else:
+                del chats[chat_id]
+            if not chats:
+                del self._global_waiters[priority]
+            if not future.done():
+                return future
+        return None
+
+    async def _hand_out_global(self):
+        try:
+            while self._global_waiters:
+                delay = self._global.take()
+                if delay:
+                    await asyncio.sleep(delay)
+                    continue
+                future = self._next_global_waiter()
+                if future is None:
+                    # Sab waiters cancel ho chuke the - token wapas
+                    self._global.tokens += 1
+                    break
+                future.set_result(None)
+        finally:
+            self._global_task = None
+
+    async def _acquire(self, priority):
+        # Free slot ho to koi live waiter nahi hai (release slot seedha waiter ko deta hai)
+        if self._active < self.concurrency:
+            self._active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Slot mil chuka tha to aage de do
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        # Slot seedha agle sabse important waiter ko (active count wahi rehta hai)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+
+# Shared instance
+outbound = PriorityRateLimiter()
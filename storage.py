@@ -0,0 +1,630 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import DB_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# postgres://... ho to PostgreSQL (multi-instance / ephemeral disk), warna DB_PATH wali SQLite file
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+DB_PATH = os.environ.get("DB_PATH", "bot_data.db")
+# Stats snapshot kitne seconds tak memory se serve ho
+STATS_TTL = float(os.environ.get("STATS_TTL", 5))
+# SQLite tuning - page size sirf nayi DB pe lagta hai (WAL me baad me nahi badalta)
+DB_PAGE_SIZE = int(os.environ.get("DB_PAGE_SIZE", 4096))
+DB_CACHE_KB = int(os.environ.get("DB_CACHE_KB", 8192))
+DB_MMAP_MB = int(os.environ.get("DB_MMAP_MB", 64))
+# WAL kitne pages ka hone par checkpoint, aur checkpoint ke baad WAL file max kitni bachi rahe
+WAL_AUTOCHECKPOINT = int(os.environ.get("WAL_AUTOCHECKPOINT", 1000))
+WAL_SIZE_LIMIT_MB = int(os.environ.get("WAL_SIZE_LIMIT_MB", 64))
+
+# Schema migrations - (version, naam, steps). Har step ya SQL string hai ya
+# (table, column, definition) jo column na ho to add karta hai. Har migration
+# apne transaction me chalti hai aur PRAGMA user_version me version likhti hai.
+# Purani (bina version wali) DBs ke liye bhi steps idempotent hain.
+# Naya change = list ke end me nayi migration; purani migrations kabhi mat badlo.
+MIGRATIONS = [
+    (1, 'base tables', [
+        '''CREATE TABLE IF NOT EXISTS chats
+           (chat_id INTEGER PRIMARY KEY, chat_title TEXT, added_date TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS broadcast
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT, timestamp TEXT,
+           broadcast_type TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS users
+           (user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT,
+           joined_date TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS media_cache
+           (asset_hash TEXT PRIMARY KEY, file_id TEXT, updated TEXT)''',
+        # Per-chat hide settings - sirf default se alag chats ki rows
+        '''CREATE TABLE IF NOT EXISTS chat_settings
+           (chat_id INTEGER PRIMARY KEY, hide_join INTEGER NOT NULL, hide_leave INTEGER NOT NULL,
+            hide_all INTEGER NOT NULL, updated TEXT)''',
+        # Bot ke join/remove/promote/demote - append-only history
+        '''CREATE TABLE IF NOT EXISTS membership_events
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER, chat_title TEXT, event TEXT,
+            old_status TEXT, new_status TEXT, actor_id INTEGER, date TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS broadcast_jobs
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT, broadcast_type TEXT,
+           status TEXT, total INTEGER DEFAULT 0, created TEXT, finished TEXT,
+           notify_chat_id INTEGER, notify_message_id INTEGER)''',
+        '''CREATE TABLE IF NOT EXISTS broadcast_recipients
+           (job_id INTEGER, chat_id INTEGER, label TEXT, status TEXT DEFAULT 'pending',
+           PRIMARY KEY (job_id, chat_id)) WITHOUT ROWID''',
+    ]),
+    # Har hot query ke liye index - EXPLAIN QUERY PLAN check (/dbcheck) inhi pe tika hai
+    (2, 'hot query indexes', [
+        # Managed Groups browser - newest-first pages aur title prefix search dono index se
+        "CREATE INDEX IF NOT EXISTS idx_chats_added ON chats (added_date, chat_id)",
+        "CREATE INDEX IF NOT EXISTS idx_chats_title ON chats (chat_title COLLATE NOCASE, chat_id)",
+        "CREATE INDEX IF NOT EXISTS idx_broadcast_type ON broadcast (broadcast_type)",
+        "CREATE INDEX IF NOT EXISTS idx_membership_events_chat ON membership_events (chat_id, id)",
+        # Startup pe running jobs resume
+        "CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs (status, id)",
+        "CREATE INDEX IF NOT EXISTS idx_recipients_status ON broadcast_recipients (job_id, status, chat_id)",
+    ]),
+    # Stats counters - triggers se incrementally maintain hote hain, COUNT(*) scan nahi.
+    # Pehli baar bante waqt hi ek baar current counts se seed hote hain.
+    (3, 'stats counters', [
+        '''CREATE TABLE IF NOT EXISTS counters
+           (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID''',
+        "INSERT OR IGNORE INTO counters (name, value) SELECT 'chats', COUNT(*) FROM chats",
+        "INSERT OR IGNORE INTO counters (name, value) SELECT 'users', COUNT(*) FROM users",
+        """INSERT OR IGNORE INTO counters (name, value)
+           SELECT 'group_broadcasts', COUNT(*) FROM broadcast WHERE broadcast_type='groups'""",
+        """INSERT OR IGNORE INTO counters (name, value)
+           SELECT 'user_broadcasts', COUNT(*) FROM broadcast WHERE broadcast_type='users'""",
+        '''CREATE TRIGGER IF NOT EXISTS trg_chats_insert AFTER INSERT ON chats
+           BEGIN UPDATE counters SET value = value + 1 WHERE name = 'chats'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_chats_delete AFTER DELETE ON chats
+           BEGIN UPDATE counters SET value = value - 1 WHERE name = 'chats'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_users_insert AFTER INSERT ON users
+           BEGIN UPDATE counters SET value = value + 1 WHERE name = 'users'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_users_delete AFTER DELETE ON users
+           BEGIN UPDATE counters SET value = value - 1 WHERE name = 'users'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_broadcast_insert AFTER INSERT ON broadcast
+           BEGIN UPDATE counters SET value = value + 1
+                 WHERE name = CASE NEW.broadcast_type WHEN 'groups' THEN 'group_broadcasts'
+                                                      WHEN 'users' THEN 'user_broadcasts' END; END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_broadcast_delete AFTER DELETE ON broadcast
+           BEGIN UPDATE counters SET value = value - 1
+                 WHERE name = CASE OLD.broadcast_type WHEN 'groups' THEN 'group_broadcasts'
+                                                      WHEN 'users' THEN 'user_broadcasts' END; END''',
+    ]),
+    # Dead chats / blocked users broadcast audience se bahar, reason ke saath
+    (4, 'active flags', [
+        ('chats', 'active', 'INTEGER NOT NULL DEFAULT 1'),
+        ('chats', 'inactive_reason', 'TEXT'),
+        ('chats', 'inactive_since', 'TEXT'),
+        ('users', 'active', 'INTEGER NOT NULL DEFAULT 1'),
+        ('users', 'inactive_reason', 'TEXT'),
+        ('users', 'inactive_since', 'TEXT'),
+        "CREATE INDEX IF NOT EXISTS idx_chats_active ON chats (active, chat_id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_active ON users (active, user_id)",
+        # Live chats ka counter - stats me sirf wahi groups jinme bot abhi hai
+        "INSERT OR IGNORE INTO counters (name, value) SELECT 'live_chats', COUNT(*) FROM chats WHERE active=1",
+        '''CREATE TRIGGER IF NOT EXISTS trg_chats_live_insert AFTER INSERT ON chats
+           BEGIN UPDATE counters SET value = value + NEW.active WHERE name = 'live_chats'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_chats_live_delete AFTER DELETE ON chats
+           BEGIN UPDATE counters SET value = value - OLD.active WHERE name = 'live_chats'; END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_chats_live_update AFTER UPDATE OF active ON chats
+           BEGIN UPDATE counters SET value = value + NEW.active - OLD.active WHERE name = 'live_chats'; END''',
+    ]),
+    # my_chat_member se aaya bot ka current status, aur last reconcile check
+    (5, 'bot status', [
+        ('chats', 'bot_status', 'TEXT'),
+        ('chats', 'verified_at', 'TEXT'),
+        # Reconciler sabse purane verified live chats pehle uthata hai
+        "CREATE INDEX IF NOT EXISTS idx_chats_verify ON chats (active, verified_at)",
+    ]),
+    # Broadcast job ek hi process chalata hai - owner aur lease (epoch seconds) tak kisi aur ka nahi
+    (6, 'broadcast job leases', [
+        ('broadcast_jobs', 'owner', 'TEXT'),
+        ('broadcast_jobs', 'lease_until', 'REAL'),
+    ]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Keyset iteration ka shuruaati cursor - har Telegram ID isse bada hai
+KEYSET_START = -2 ** 63
+
+# Broadcast job / recipient statuses
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_CANCELLED = 'cancelled'
+RECIPIENT_PENDING = 'pending'
+JOB_COLUMNS = ('id', 'message', 'broadcast_type', 'status', 'total', 'created', 'finished',
+               'notify_chat_id', 'notify_message_id', 'owner', 'lease_until')
+
+# Hot statements - ek hi jagah define, taaki connection ka statement cache inhe reuse kare
+SQL_INSERT_USER = '''INSERT OR IGNORE INTO users (user_id, username, first_name, joined_date)
+                     VALUES (?, ?, ?, ?)'''
+SQL_INSERT_CHAT = "INSERT OR IGNORE INTO chats (chat_id, chat_title, added_date) VALUES (?, ?, ?)"
+SQL_REPLACE_CHAT = "INSERT OR REPLACE INTO chats (chat_id, chat_title, added_date) VALUES (?, ?, ?)"
+SQL_UPDATE_CHAT_TITLE = "UPDATE chats SET chat_title=? WHERE chat_id=?"
+SQL_KNOWN_CHATS = "SELECT chat_id, chat_title, active FROM chats"
+SQL_KNOWN_USERS = "SELECT user_id, active FROM users"
+SQL_SET_CHAT_ACTIVE = "UPDATE chats SET active=?, inactive_reason=?, inactive_since=? WHERE chat_id=?"
+SQL_SET_USER_ACTIVE = "UPDATE users SET active=?, inactive_reason=?, inactive_since=? WHERE user_id=?"
+SQL_SET_BOT_STATUS = "UPDATE chats SET bot_status=?, verified_at=? WHERE chat_id=?"
+SQL_CHATS_TO_VERIFY = "SELECT chat_id, chat_title, bot_status FROM chats WHERE active=1 ORDER BY verified_at LIMIT ?"
+SQL_INSERT_MEMBERSHIP_EVENT = """INSERT INTO membership_events
+                                 (chat_id, chat_title, event, old_status, new_status, actor_id, date)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?)"""
+SQL_COUNTERS = "SELECT name, value FROM counters"
+SQL_LOAD_CHAT_SETTINGS = "SELECT chat_id, hide_join, hide_leave, hide_all FROM chat_settings"
+SQL_SAVE_CHAT_SETTINGS = """INSERT OR REPLACE INTO chat_settings (chat_id, hide_join, hide_leave, hide_all, updated)
+                            VALUES (?, ?, ?, ?, ?)"""
+SQL_CHAT_SORT_KEYS = "SELECT added_date, chat_title FROM chats WHERE chat_id=?"
+# Keyset pages: (search, backwards) -> query. Cursor ke aage/peeche ki rows seedhe index range se.
+_CHATS_PAGE = "SELECT chat_id, chat_title, added_date FROM chats"
+_TITLE_RANGE = "chat_title >= ? COLLATE NOCASE AND chat_title < ? COLLATE NOCASE"
+SQL_CHATS_FIRST_PAGE = {
+    False: f"{_CHATS_PAGE} ORDER BY added_date DESC, chat_id DESC LIMIT ?",
+    True: f"{_CHATS_PAGE} WHERE {_TITLE_RANGE} ORDER BY chat_title COLLATE NOCASE, chat_id LIMIT ?",
+}
+SQL_CHATS_PAGE = {
+    (False, False): f"""{_CHATS_PAGE} WHERE (added_date, chat_id) < (?, ?)
+                        ORDER BY added_date DESC, chat_id DESC LIMIT ?""",
+    (False, True): f"""{_CHATS_PAGE} WHERE (added_date, chat_id) > (?, ?)
+                       ORDER BY added_date, chat_id LIMIT ?""",
+    (True, False): f"""{_CHATS_PAGE} WHERE {_TITLE_RANGE} AND (chat_title COLLATE NOCASE, chat_id) > (?, ?)
+                       ORDER BY chat_title COLLATE NOCASE, chat_id LIMIT ?""",
+    (True, True): f"""{_CHATS_PAGE} WHERE {_TITLE_RANGE} AND (chat_title COLLATE NOCASE, chat_id) < (?, ?)
+                      ORDER BY chat_title COLLATE NOCASE DESC, chat_id DESC LIMIT ?""",
+}
+SQL_JOB_MESSAGE = "SELECT message, broadcast_type FROM broadcast_jobs WHERE id=?"
+SQL_LOG_BROADCAST = "INSERT INTO broadcast (message, timestamp, broadcast_type) VALUES (?, ?, ?)"
+SQL_GET_FILE_ID = "SELECT file_id FROM media_cache WHERE asset_hash=?"
+SQL_SET_FILE_ID = "INSERT OR REPLACE INTO media_cache (asset_hash, file_id, updated) VALUES (?, ?, ?)"
+SQL_DELETE_FILE_ID = "DELETE FROM media_cache WHERE asset_hash=?"
+SQL_CREATE_JOB = "INSERT INTO broadcast_jobs (message, broadcast_type, status, created) VALUES (?, ?, ?, ?)"
+SQL_JOB_RECIPIENTS = {
+    'groups': '''INSERT INTO broadcast_recipients (job_id, chat_id, label)
+                 SELECT ?, chat_id, chat_title FROM chats WHERE active=1''',
+    'users': '''INSERT INTO broadcast_recipients (job_id, chat_id, label)
+                SELECT ?, user_id, username FROM users WHERE active=1''',
+}
+SQL_SET_JOB_TOTAL = "UPDATE broadcast_jobs SET total=? WHERE id=?"
+SQL_SET_JOB_MESSAGE = "UPDATE broadcast_jobs SET notify_chat_id=?, notify_message_id=? WHERE id=?"
+SQL_SET_JOB_STATUS = "UPDATE broadcast_jobs SET status=?, finished=? WHERE id=?"
+SQL_GET_JOB = f"SELECT {', '.join(JOB_COLUMNS)} FROM broadcast_jobs WHERE id=?"
+SQL_LIST_JOBS = f"SELECT {', '.join(JOB_COLUMNS)} FROM broadcast_jobs ORDER BY id DESC LIMIT ?"
+SQL_RUNNING_JOBS = f"SELECT {', '.join(JOB_COLUMNS)} FROM broadcast_jobs WHERE status=? ORDER BY id"
+# Claim ek hi UPDATE me - do replicas ek saath try karein to bhi sirf ek ki row badalti hai
+SQL_CLAIM_JOB = """UPDATE broadcast_jobs SET owner=?, lease_until=? WHERE id=? AND status=?
+                   AND (owner IS NULL OR owner=? OR lease_until < ?)"""
+SQL_RENEW_JOB = "UPDATE broadcast_jobs SET lease_until=? WHERE id=? AND owner=? AND status=?"
+SQL_RELEASE_JOB = "UPDATE broadcast_jobs SET owner=NULL, lease_until=NULL WHERE id=? AND owner=?"
+# Keyset pages - cursor ke baad agle LIMIT rows, poori audience kabhi memory me nahi
+SQL_PENDING_RECIPIENTS = '''SELECT chat_id, label FROM broadcast_recipients
+                            WHERE job_id=? AND status=? AND chat_id > ? ORDER BY chat_id LIMIT ?'''
+SQL_SET_RECIPIENT_STATUS = "UPDATE broadcast_recipients SET status=? WHERE job_id=? AND chat_id=?"
+# Export/import - chats aur users ke portable columns (bot_status/verified_at reconcile khud bharta hai)
+TRANSFER_COLUMNS = {
+    'chats': ('chat_id', 'chat_title', 'added_date', 'active', 'inactive_reason', 'inactive_since'),
+    'users': ('user_id', 'username', 'first_name', 'joined_date', 'active', 'inactive_reason', 'inactive_since'),
+}
+SQL_EXPORT = {
+    table: f"SELECT {', '.join(columns)} FROM {table} WHERE {columns[0]} > ? ORDER BY {columns[0]} LIMIT ?"
+    for table, columns in TRANSFER_COLUMNS.items()
+}
+# Merge - jo row pehle se hai wahi rehti hai
+SQL_IMPORT = {
+    table: f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for table, columns in TRANSFER_COLUMNS.items()
+}
+SQL_JOB_PROGRESS = "SELECT status, COUNT(*) FROM broadcast_recipients WHERE job_id=? GROUP BY status"
+
+# In statements ka poora table padhna jaan-boojh kar hai (startup load, chhoti tables,
+# ya rowid order ka scan jo LIMIT pe ruk jaata hai)
+FULL_SCAN_OK = {'SQL_KNOWN_CHATS', 'SQL_KNOWN_USERS', 'SQL_COUNTERS', 'SQL_LOAD_CHAT_SETTINGS', 'SQL_LIST_JOBS'}
+
+
+def hot_statements():
+    """(name, sql) for every SQL_* statement in this module"""
+    for name, value in sorted(globals().items()):
+        if not name.startswith('SQL_'):
+            continue
+        if isinstance(value, dict):
+            for key, sql in value.items():
+                yield f"{name}[{key}]", sql
+        else:
+            yield name, value
+
+
+def plan_problems(name, details):
+    """Plan lines that mean a full table scan or an unindexed sort"""
+    if name.split('[')[0] in FULL_SCAN_OK:
+        return []
+    return [d for d in details
+            if (d.startswith('SCAN ') and 'USING' not in d) or d.startswith('USE TEMP B-TREE')]
+
+
+class BaseStorage(ABC):
+    """Storage interface shared by the SQLite and PostgreSQL backends.
+
+    Bot ke saare queries yahin hain aur sirf generic primitives (execute,
+    executemany, write_batch, fetchone, fetchall) pe tike hain, jo har
+    backend apne tareeke se deta hai. Statements SQLite dialect (? params)
+    me hain; doosra backend unhe apne dialect me translate karta hai.
+    Jo kaam ek transaction me kai steps hain (job banana, page dhoondhna)
+    wo har backend khud implement karta hai.
+    """
+
+    # Kai bot processes ek hi database use kar sakte hain (in-memory state ko refresh chahiye)
+    shared = False
+
+    def __init__(self):
+        self._stats = None          # (fetched_at, counters dict)
+
+    # Backend primitives
+    @abstractmethod
+    async def open(self):
+        """Connect and bring the schema up to date"""
+
+    @abstractmethod
+    async def close(self):
+        """Release the connection (pool)"""
+
+    @abstractmethod
+    async def check(self):
+        """Schema version, settings and query plans for /dbcheck"""
+
+    @abstractmethod
+    async def execute(self, sql, params=()):
+        """Run one statement; returns the affected row count"""
+
+    @abstractmethod
+    async def executemany(self, sql, rows):
+        """Run one statement for many rows in one transaction"""
+
+    @abstractmethod
+    async def write_batch(self, batch):
+        """Run several (sql, rows) pairs in one transaction"""
+
+    @abstractmethod
+    async def fetchone(self, sql, params=()):
+        """First row as a tuple, or None"""
+
+    @abstractmethod
+    async def fetchall(self, sql, params=()):
+        """All rows as tuples"""
+
+    @abstractmethod
+    async def chats_page(self, cursor=None, backwards=False, prefix=None, limit=50):
+        """One page of chats around a cursor chat_id; returns (rows, has_prev, has_next).
+
+        Bina prefix ke newest first, prefix ke saath title order (case-insensitive).
+        """
+
+    @abstractmethod
+    async def create_broadcast_job(self, message, broadcast_type):
+        """Snapshot the audience into a new job; returns (job_id, total)"""
+
+    @abstractmethod
+    async def finish_job(self, job_id, status):
+        """Mark a job finished; a done job is also logged into broadcast history"""
+
+    # Bot specific queries
+    async def add_user(self, user_id, username, first_name):
+        await self.execute(SQL_INSERT_USER, (user_id, username, first_name, datetime.now().isoformat()))
+
+    async def add_chat(self, chat_id, chat_title, replace=False):
+        sql = SQL_REPLACE_CHAT if replace else SQL_INSERT_CHAT
+        await self.execute(sql, (chat_id, chat_title, datetime.now().isoformat()))
+
+    async def load_known_ids(self):
+        """(chat_id, chat_title, active) rows and (user_id, active) rows"""
+        chats = await self.fetchall(SQL_KNOWN_CHATS)
+        users = await self.fetchall(SQL_KNOWN_USERS)
+        return chats, users
+
+    async def load_chat_settings(self):
+        return await self.fetchall(SQL_LOAD_CHAT_SETTINGS)
+
+    async def save_chat_settings(self, chat_id, hide_join, hide_leave, hide_all):
+        await self.execute(SQL_SAVE_CHAT_SETTINGS,
+                           (chat_id, int(hide_join), int(hide_leave), int(hide_all), datetime.now().isoformat()))
+
+    async def chats_to_verify(self, limit):
+        """Live chats checked longest ago (never-checked first)"""
+        return await self.fetchall(SQL_CHATS_TO_VERIFY, (limit,))
+
+    async def set_verified(self, rows):
+        """rows: (bot_status, chat_id) for chats that were just checked"""
+        now = datetime.now().isoformat()
+        await self.executemany(SQL_SET_BOT_STATUS, [(status, now, chat_id) for status, chat_id in rows])
+
+    async def _load_counters(self):
+        return dict(await self.fetchall(SQL_COUNTERS))
+
+    async def get_stats(self):
+        """Counters snapshot, refreshed from the database at most every STATS_TTL seconds"""
+        now = time.monotonic()
+        if self._stats is None or now - self._stats[0] > STATS_TTL:
+            self._stats = (now, await self._load_counters())
+        return dict(self._stats[1])
+
+    # Broadcast jobs
+    async def set_job_message(self, job_id, chat_id, message_id):
+        await self.execute(SQL_SET_JOB_MESSAGE, (chat_id, message_id, job_id))
+
+    async def get_job(self, job_id):
+        row = await self.fetchone(SQL_GET_JOB, (job_id,))
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    async def list_jobs(self, limit=10):
+        return [dict(zip(JOB_COLUMNS, row)) for row in await self.fetchall(SQL_LIST_JOBS, (limit,))]
+
+    async def get_running_jobs(self):
+        return [dict(zip(JOB_COLUMNS, row)) for row in await self.fetchall(SQL_RUNNING_JOBS, (JOB_RUNNING,))]
+
+    async def claim_job(self, job_id, owner, lease):
+        """Take a running job for lease seconds; False if another owner still holds it"""
+        now = time.time()
+        return await self.execute(SQL_CLAIM_JOB, (owner, now + lease, job_id, JOB_RUNNING, owner, now)) == 1
+
+    async def renew_job(self, job_id, owner, lease):
+        """Extend the lease; False once the job is no longer running or has a new owner"""
+        return await self.execute(SQL_RENEW_JOB, (time.time() + lease, job_id, owner, JOB_RUNNING)) == 1
+
+    async def release_job(self, job_id, owner):
+        await self.execute(SQL_RELEASE_JOB, (job_id, owner))
+
+    async def iter_pending_recipients(self, job_id, batch_size=500):
+        """Pending (chat_id, label) rows in chat_id order, fetched batch_size at a time"""
+        after = KEYSET_START
+        while True:
+            rows = await self.fetchall(SQL_PENDING_RECIPIENTS, (job_id, RECIPIENT_PENDING, after, batch_size))
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    async def set_recipient_statuses(self, rows):
+        """rows: (status, job_id, chat_id) tuples, written in one transaction"""
+        await self.executemany(SQL_SET_RECIPIENT_STATUS, rows)
+
+    async def get_job_progress(self, job_id):
+        return dict(await self.fetchall(SQL_JOB_PROGRESS, (job_id,)))
+
+    # Export / import
+    async def iter_table(self, table, batch_size=1000):
+        """Batches of TRANSFER_COLUMNS rows of chats or users, in id order"""
+        after = KEYSET_START
+        while True:
+            rows = await self.fetchall(SQL_EXPORT[table], (after, batch_size))
+            if rows:
+                yield rows
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    async def import_rows(self, table, rows):
+        """Insert TRANSFER_COLUMNS rows in one transaction, keeping rows that already exist; returns how many were new"""
+        # INSERT OR IGNORE - ignore hui rows rowcount me nahi aati
+        return await self.executemany(SQL_IMPORT[table], rows)
+
+    async def get_file_id(self, asset_hash):
+        row = await self.fetchone(SQL_GET_FILE_ID, (asset_hash,))
+        return row[0] if row else None
+
+    async def set_file_id(self, asset_hash, file_id):
+        await self.execute(SQL_SET_FILE_ID, (asset_hash, file_id, datetime.now().isoformat()))
+
+    async def delete_file_id(self, asset_hash):
+        await self.execute(SQL_DELETE_FILE_ID, (asset_hash,))
+
+
+class SQLiteStorage(BaseStorage):
+    """Single long-lived SQLite connection (WAL mode).
+
+    Saara blocking DB kaam ek dedicated worker thread pe chalta hai, isliye
+    event loop kabhi disk fsync pe nahi rukta. Ek hi thread hone se writes
+    apne aap serialize ho jaate hain.
+    """
+
+    def __init__(self, path=DB_PATH):
+        super().__init__()
+        self.path = path
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        # Khali (nayi) DB pe hi asar karta hai - journal_mode se pehle hona chahiye
+        conn.execute(f"PRAGMA page_size={DB_PAGE_SIZE}")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute(f"PRAGMA wal_autocheckpoint={WAL_AUTOCHECKPOINT}")
+        conn.execute(f"PRAGMA journal_size_limit={WAL_SIZE_LIMIT_MB * 1024 * 1024}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_MB * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # INSERT OR REPLACE ka implicit delete bhi delete trigger chalaye, warna counters bigdenge
+        conn.execute("PRAGMA recursive_triggers=ON")
+        self._migrate(conn)
+        return conn
+
+    def _migrate(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            logger.warning(f"🗄️ Database schema v{version} is newer than this code (v{SCHEMA_VERSION})")
+            return
+        for target, name, steps in MIGRATIONS:
+            if target <= version:
+                continue
+            started = time.perf_counter()
+            # sqlite3 DDL ke liye khud transaction nahi kholta - explicit BEGIN
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for step in steps:
+                    if isinstance(step, tuple):
+                        self._add_column_if_missing(conn, *step)
+                    else:
+                        conn.execute(step)
+                conn.execute(f"PRAGMA user_version={target}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.error(f"🗄️ Migration v{target} ({name}) failed, rolled back")
+                raise
+            logger.info(f"🗄️ Migration v{target} applied: {name} ({time.perf_counter() - started:.2f}s)")
+
+    @staticmethod
+    def _add_column_if_missing(conn, table, column, definition):
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"🗄️ Added column {table}.{column}")
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._timed, fn, args)
+
+    @staticmethod
+    def _timed(fn, args):
+        # Worker thread me lagne wala asli time (queue wait nahi)
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            DB_LATENCY.labels(fn.__name__.lstrip('_')).observe(time.perf_counter() - started)
+
+    # Worker thread pe chalne wale helpers
+    def _execute(self, sql, params=()):
+        with self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def _executemany(self, sql, rows):
+        with self._conn:
+            return self._conn.executemany(sql, rows).rowcount
+
+    def _write_batch(self, batch):
+        # Saare statements ek hi transaction me - ek commit, ek fsync
+        with self._conn:
+            for sql, rows in batch:
+                if rows:
+                    self._conn.executemany(sql, rows)
+
+    def _fetchone(self, sql, params=()):
+        return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params=()):
+        return self._conn.execute(sql, params).fetchall()
+
+    def _create_job(self, message, broadcast_type):
+        now = datetime.now().isoformat()
+        with self._conn:
+            job_id = self._conn.execute(SQL_CREATE_JOB, (message, broadcast_type, JOB_RUNNING, now)).lastrowid
+            total = self._conn.execute(SQL_JOB_RECIPIENTS[broadcast_type], (job_id,)).rowcount
+            self._conn.execute(SQL_SET_JOB_TOTAL, (total, job_id))
+        return job_id, total
+
+    def _chats_page(self, cursor, backwards, prefix, limit):
+        search = prefix is not None
+        params = (prefix, prefix + '\U0010ffff') if search else ()
+        keys = self._conn.execute(SQL_CHAT_SORT_KEYS, (cursor,)).fetchone() if cursor is not None else None
+        if keys is None:
+            # Pehla page (ya cursor wali chat ab exist nahi karti)
+            rows = self._conn.execute(SQL_CHATS_FIRST_PAGE[search], params + (limit + 1,)).fetchall()
+            return rows[:limit], False, len(rows) > limit
+
+        sort_key = keys[1] if search else keys[0]
+        rows = self._conn.execute(SQL_CHATS_PAGE[search, backwards],
+                                  params + (sort_key, cursor, limit + 1)).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            return rows[::-1], more, True
+        return rows, True, more
+
+    def _check(self):
+        conn = self._conn
+        plans = []
+        for name, sql in hot_statements():
+            params = (None,) * sql.count('?')
+            details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            plans.append((name, details, plan_problems(name, details)))
+        return {
+            'version': conn.execute("PRAGMA user_version").fetchone()[0],
+            'page_size': conn.execute("PRAGMA page_size").fetchone()[0],
+            'journal_mode': conn.execute("PRAGMA journal_mode").fetchone()[0],
+            'plans': plans,
+        }
+
+    def _finish_job(self, job_id, status):
+        now = datetime.now().isoformat()
+        with self._conn:
+            self._conn.execute(SQL_SET_JOB_STATUS, (status, now, job_id))
+            if status == JOB_DONE:
+                # Completed job stats ke liye purani broadcast table me bhi jaata hai
+                message, broadcast_type = self._conn.execute(SQL_JOB_MESSAGE, (job_id,)).fetchone()
+                self._conn.execute(SQL_LOG_BROADCAST, (message, now, broadcast_type))
+
+    # Lifecycle
+    async def open(self):
+        if self._conn is None:
+            self._conn = await self._run(self._connect)
+            logger.info(f"🗄️ Database ready: {self.path}")
+
+    async def close(self):
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    async def check(self):
+        """Schema version, page/journal settings and the query plan of every hot statement.
+
+        plans: (name, plan lines, problem lines) - problem = full scan ya temp b-tree sort.
+        """
+        return await self._run(self._check)
+
+    # Generic access
+    async def execute(self, sql, params=()):
+        return await self._run(self._execute, sql, params)
+
+    async def executemany(self, sql, rows):
+        return await self._run(self._executemany, sql, rows)
+
+    async def write_batch(self, batch):
+        """Run several (sql, rows) pairs in one transaction"""
+        await self._run(self._write_batch, batch)
+
+    async def fetchone(self, sql, params=()):
+        return await self._run(self._fetchone, sql, params)
+
+    async def fetchall(self, sql, params=()):
+        return await self._run(self._fetchall, sql, params)
+
+    # Multi-step queries
+    async def chats_page(self, cursor=None, backwards=False, prefix=None, limit=50):
+        return await self._run(self._chats_page, cursor, backwards, prefix, limit)
+
+    async def create_broadcast_job(self, message, broadcast_type):
+        return await self._run(self._create_job, message, broadcast_type)
+
+    async def finish_job(self, job_id, status):
+        await self._run(self._finish_job, job_id, status)
+
+
+def create_storage(url=DATABASE_URL):
+    """Backend for a DATABASE_URL: postgres:// ke liye PostgreSQL pool, warna local SQLite file"""
+    if url.startswith(('postgres://', 'postgresql://')):
+        # asyncpg sirf Postgres deployments pe chahiye
+        from storage_pg import PostgresStorage
+        return PostgresStorage(url)
+    return SQLiteStorage()
+
+
+# Shared instance - saare handlers isi se DB access karte hain
+db = create_storage()
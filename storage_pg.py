@@ -0,0 +1,402 @@
+import os
+import re
+import time
+import logging
+from datetime import datetime
+
+import asyncpg
+
+from metrics import DB_LATENCY
+from storage import (BaseStorage, FULL_SCAN_OK, hot_statements, JOB_RUNNING, JOB_DONE, TRANSFER_COLUMNS,
+                     SQL_INSERT_USER, SQL_INSERT_CHAT, SQL_REPLACE_CHAT, SQL_SAVE_CHAT_SETTINGS, SQL_SET_FILE_ID,
+                     SQL_CHATS_TO_VERIFY, SQL_CREATE_JOB, SQL_JOB_RECIPIENTS, SQL_SET_JOB_TOTAL, SQL_SET_JOB_STATUS,
+                     SQL_JOB_MESSAGE, SQL_LOG_BROADCAST, SQL_CHAT_SORT_KEYS, SQL_CHATS_FIRST_PAGE,
+                     SQL_CHATS_PAGE)
+
+logger = logging.getLogger(__name__)
+
+# Connection pool size - har replica ka apna pool
+PG_POOL_MIN = int(os.environ.get("PG_POOL_MIN", 1))
+PG_POOL_MAX = int(os.environ.get("PG_POOL_MAX", 10))
+# Har connection pe kitne prepared statements cache hon (SQLite cached_statements jaisa)
+PG_STATEMENT_CACHE = int(os.environ.get("PG_STATEMENT_CACHE", 256))
+
+# Replicas ek saath start hon to migrations ek hi chalaye
+MIGRATION_LOCK = 0x6a6f696e
+
+# Schema migrations - SQLite wali MIGRATIONS jaisi, par Postgres types ke saath
+# (Telegram IDs 32-bit se bade hote hain - BIGINT). Version schema_version table me.
+MIGRATIONS = [
+    (1, 'base tables', [
+        '''CREATE TABLE IF NOT EXISTS chats
+           (chat_id BIGINT PRIMARY KEY, chat_title TEXT, added_date TEXT,
+            active INTEGER NOT NULL DEFAULT 1, inactive_reason TEXT, inactive_since TEXT,
+            bot_status TEXT, verified_at TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS broadcast
+           (id BIGSERIAL PRIMARY KEY, message TEXT, timestamp TEXT, broadcast_type TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS users
+           (user_id BIGINT PRIMARY KEY, username TEXT, first_name TEXT, joined_date TEXT,
+            active INTEGER NOT NULL DEFAULT 1, inactive_reason TEXT, inactive_since TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS media_cache
+           (asset_hash TEXT PRIMARY KEY, file_id TEXT, updated TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS chat_settings
+           (chat_id BIGINT PRIMARY KEY, hide_join INTEGER NOT NULL, hide_leave INTEGER NOT NULL,
+            hide_all INTEGER NOT NULL, updated TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS membership_events
+           (id BIGSERIAL PRIMARY KEY, chat_id BIGINT, chat_title TEXT, event TEXT,
+            old_status TEXT, new_status TEXT, actor_id BIGINT, date TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS broadcast_jobs
+           (id BIGSERIAL PRIMARY KEY, message TEXT, broadcast_type TEXT,
+            status TEXT, total INTEGER DEFAULT 0, created TEXT, finished TEXT,
+            notify_chat_id BIGINT, notify_message_id BIGINT)''',
+        '''CREATE TABLE IF NOT EXISTS broadcast_recipients
+           (job_id BIGINT, chat_id BIGINT, label TEXT, status TEXT DEFAULT 'pending',
+            PRIMARY KEY (job_id, chat_id))''',
+    ]),
+    (2, 'hot query indexes', [
+        "CREATE INDEX IF NOT EXISTS idx_chats_added ON chats (added_date, chat_id)",
+        # Title search byte order me (COLLATE "C"), taaki prefix range seedhe index se
+        '''CREATE INDEX IF NOT EXISTS idx_chats_title ON chats ((lower(chat_title) COLLATE "C"), chat_id)''',
+        "CREATE INDEX IF NOT EXISTS idx_chats_active ON chats (active, chat_id)",
+        "CREATE INDEX IF NOT EXISTS idx_chats_verify ON chats (active, verified_at NULLS FIRST)",
+        "CREATE INDEX IF NOT EXISTS idx_users_active ON users (active, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_broadcast_type ON broadcast (broadcast_type)",
+        "CREATE INDEX IF NOT EXISTS idx_membership_events_chat ON membership_events (chat_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs (status, id)",
+        "CREATE INDEX IF NOT EXISTS idx_recipients_status ON broadcast_recipients (job_id, status, chat_id)",
+    ]),
+    # Stats ke liye COUNT(*) scans nahi - SQLite migrations 3 aur 4 jaise trigger-maintained counters.
+    # Upsert (SQL_REPLACE_CHAT) row ko update karta hai, isliye live_chats UPDATE OF active pe bhi.
+    (3, 'stats counters', [
+        "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value BIGINT NOT NULL DEFAULT 0)",
+        "INSERT INTO counters (name, value) SELECT 'chats', COUNT(*) FROM chats ON CONFLICT DO NOTHING",
+        """INSERT INTO counters (name, value) SELECT 'live_chats', COUNT(*) FROM chats WHERE active=1
+           ON CONFLICT DO NOTHING""",
+        "INSERT INTO counters (name, value) SELECT 'users', COUNT(*) FROM users ON CONFLICT DO NOTHING",
+        """INSERT INTO counters (name, value)
+           SELECT 'group_broadcasts', COUNT(*) FROM broadcast WHERE broadcast_type='groups' ON CONFLICT DO NOTHING""",
+        """INSERT INTO counters (name, value)
+           SELECT 'user_broadcasts', COUNT(*) FROM broadcast WHERE broadcast_type='users' ON CONFLICT DO NOTHING""",
+        """CREATE OR REPLACE FUNCTION count_chats() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               IF TG_OP = 'INSERT' THEN
+                   UPDATE counters SET value = value + 1 WHERE name = 'chats';
+                   UPDATE counters SET value = value + NEW.active WHERE name = 'live_chats';
+               ELSIF TG_OP = 'DELETE' THEN
+                   UPDATE counters SET value = value - 1 WHERE name = 'chats';
+                   UPDATE counters SET value = value - OLD.active WHERE name = 'live_chats';
+               ELSIF NEW.active <> OLD.active THEN
+                   UPDATE counters SET value = value + NEW.active - OLD.active WHERE name = 'live_chats';
+               END IF;
+               RETURN NULL;
+           END $$""",
+        """CREATE OR REPLACE FUNCTION count_users() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               IF TG_OP = 'INSERT' THEN
+                   UPDATE counters SET value = value + 1 WHERE name = 'users';
+               ELSE
+                   UPDATE counters SET value = value - 1 WHERE name = 'users';
+               END IF;
+               RETURN NULL;
+           END $$""",
+        """CREATE OR REPLACE FUNCTION count_broadcasts() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               IF TG_OP = 'INSERT' THEN
+                   UPDATE counters SET value = value + 1
+                   WHERE name = CASE NEW.broadcast_type WHEN 'groups' THEN 'group_broadcasts'
+                                                        WHEN 'users' THEN 'user_broadcasts' END;
+               ELSE
+                   UPDATE counters SET value = value - 1
+                   WHERE name = CASE OLD.broadcast_type WHEN 'groups' THEN 'group_broadcasts'
+                                                        WHEN 'users' THEN 'user_broadcasts' END;
+               END IF;
+               RETURN NULL;
+           END $$""",
+        "DROP TRIGGER IF EXISTS trg_chats_count ON chats",
+        """CREATE TRIGGER trg_chats_count AFTER INSERT OR DELETE OR UPDATE OF active ON chats
+           FOR EACH ROW EXECUTE FUNCTION count_chats()""",
+        "DROP TRIGGER IF EXISTS trg_users_count ON users",
+        """CREATE TRIGGER trg_users_count AFTER INSERT OR DELETE ON users
+           FOR EACH ROW EXECUTE FUNCTION count_users()""",
+        "DROP TRIGGER IF EXISTS trg_broadcast_count ON broadcast",
+        """CREATE TRIGGER trg_broadcast_count AFTER INSERT OR DELETE ON broadcast
+           FOR EACH ROW EXECUTE FUNCTION count_broadcasts()""",
+    ]),
+    # Replicas me broadcast job ek hi chalata hai - owner aur lease (epoch seconds)
+    (4, 'broadcast job leases', [
+        "ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS owner TEXT",
+        "ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS lease_until DOUBLE PRECISION",
+    ]),
+]
+
+# Import - executemany command status nahi deta, isliye poora batch arrays me ek INSERT
+# ("INSERT 0 n" me n = nayi rows)
+PG_IMPORT_TYPES = {
+    'chats': ('bigint', 'text', 'text', 'integer', 'text', 'text'),
+    'users': ('bigint', 'text', 'text', 'text', 'integer', 'text', 'text'),
+}
+PG_IMPORT = {
+    table: f"""INSERT INTO {table} ({', '.join(TRANSFER_COLUMNS[table])})
+               SELECT * FROM unnest({', '.join(f'${index}::{kind}[]' for index, kind in enumerate(types, 1))})
+               ON CONFLICT DO NOTHING"""
+    for table, types in PG_IMPORT_TYPES.items()
+}
+
+# Managed Groups browser - SQLite ke NOCASE ki jagah lower() byte order me
+_CHATS_PAGE = "SELECT chat_id, chat_title, added_date FROM chats"
+_TITLE = 'lower(chat_title) COLLATE "C"'
+_TITLE_RANGE = f"{_TITLE} >= lower($1::text) AND {_TITLE} < lower($1::text) || chr(1114111)"
+PG_CHAT_SORT_KEYS = "SELECT added_date, lower(chat_title) FROM chats WHERE chat_id=$1"
+PG_CHATS_FIRST_PAGE = {
+    False: f"{_CHATS_PAGE} ORDER BY added_date DESC, chat_id DESC LIMIT $1",
+    True: f"{_CHATS_PAGE} WHERE {_TITLE_RANGE} ORDER BY {_TITLE}, chat_id LIMIT $2",
+}
+PG_CHATS_PAGE = {
+    (False, False): f"""{_CHATS_PAGE} WHERE (added_date, chat_id) < ($1, $2)
+                        ORDER BY added_date DESC, chat_id DESC LIMIT $3""",
+    (False, True): f"""{_CHATS_PAGE} WHERE (added_date, chat_id) > ($1, $2)
+                       ORDER BY added_date, chat_id LIMIT $3""",
+    (True, False): f"""{_CHATS_PAGE} WHERE {_TITLE_RANGE} AND ({_TITLE}, chat_id) > ($2::text, $3)
+                       ORDER BY {_TITLE}, chat_id LIMIT $4""",
+    (True, True): f"""{_CHATS_PAGE} WHERE {_TITLE_RANGE} AND ({_TITLE}, chat_id) < ($2::text, $3)
+                      ORDER BY {_TITLE} DESC, chat_id DESC LIMIT $4""",
+}
+
+# SQLite statements jo mechanical ? -> $n se nahi bante (upserts, RETURNING, NULL order)
+PG_SQL = {
+    SQL_INSERT_USER: """INSERT INTO users (user_id, username, first_name, joined_date)
+                        VALUES ($1, $2, $3, $4) ON CONFLICT DO NOTHING""",
+    SQL_INSERT_CHAT: """INSERT INTO chats (chat_id, chat_title, added_date)
+                        VALUES ($1, $2, $3) ON CONFLICT DO NOTHING""",
+    # INSERT OR REPLACE jaisa - baaki columns default pe wapas
+    SQL_REPLACE_CHAT: """INSERT INTO chats (chat_id, chat_title, added_date) VALUES ($1, $2, $3)
+                         ON CONFLICT (chat_id) DO UPDATE SET
+                         chat_title=EXCLUDED.chat_title, added_date=EXCLUDED.added_date, active=1,
+                         inactive_reason=NULL, inactive_since=NULL, bot_status=NULL, verified_at=NULL""",
+    SQL_SAVE_CHAT_SETTINGS: """INSERT INTO chat_settings (chat_id, hide_join, hide_leave, hide_all, updated)
+                               VALUES ($1, $2, $3, $4, $5) ON CONFLICT (chat_id) DO UPDATE SET
+                               hide_join=EXCLUDED.hide_join, hide_leave=EXCLUDED.hide_leave,
+                               hide_all=EXCLUDED.hide_all, updated=EXCLUDED.updated""",
+    SQL_SET_FILE_ID: """INSERT INTO media_cache (asset_hash, file_id, updated) VALUES ($1, $2, $3)
+                        ON CONFLICT (asset_hash) DO UPDATE SET file_id=EXCLUDED.file_id, updated=EXCLUDED.updated""",
+    # SQLite me NULL pehle aata hai, Postgres me aakhir me
+    SQL_CHATS_TO_VERIFY: """SELECT chat_id, chat_title, bot_status FROM chats WHERE active=1
+                            ORDER BY verified_at NULLS FIRST LIMIT $1""",
+    SQL_CREATE_JOB: """INSERT INTO broadcast_jobs (message, broadcast_type, status, created)
+                       VALUES ($1, $2, $3, $4) RETURNING id""",
+    SQL_JOB_RECIPIENTS['groups']: '''INSERT INTO broadcast_recipients (job_id, chat_id, label)
+                                     SELECT $1::bigint, chat_id, chat_title FROM chats WHERE active=1''',
+    SQL_JOB_RECIPIENTS['users']: '''INSERT INTO broadcast_recipients (job_id, chat_id, label)
+                                    SELECT $1::bigint, user_id, username FROM users WHERE active=1''',
+    SQL_CHAT_SORT_KEYS: PG_CHAT_SORT_KEYS,
+    **{SQL_CHATS_FIRST_PAGE[key]: sql for key, sql in PG_CHATS_FIRST_PAGE.items()},
+    **{SQL_CHATS_PAGE[key]: sql for key, sql in PG_CHATS_PAGE.items()},
+}
+
+
+def to_postgres(sql):
+    """SQLite statement -> Postgres: override table, warna ? placeholders -> $1, $2, ..."""
+    override = PG_SQL.get(sql)
+    if override is not None:
+        return override
+    if sql.startswith('INSERT OR IGNORE INTO'):
+        sql = sql.replace('INSERT OR IGNORE INTO', 'INSERT INTO', 1) + ' ON CONFLICT DO NOTHING'
+    parts = sql.split('?')
+    return parts[0] + ''.join(f"${index}{part}" for index, part in enumerate(parts[1:], 1))
+
+
+def _rowcount(status):
+    # asyncpg command status - "UPDATE 3", "INSERT 0 5"
+    last = status.rsplit(' ', 1)[-1] if status else ''
+    return int(last) if last.isdigit() else -1
+
+
+class PostgresStorage(BaseStorage):
+    """PostgreSQL backend on an asyncpg connection pool.
+
+    Kai replicas ek hi database share kar sakte hain aur ephemeral disk pe
+    data nahi khota. Queries BaseStorage wali hi hain; SQLite dialect ke
+    statements ek baar translate hokar cache hote hain, aur asyncpg har
+    connection pe unhe prepared statements ki tarah reuse karta hai.
+    """
+
+    shared = True
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self._pool = None
+        self._translated = {}    # SQLite sql -> Postgres sql
+
+    def _sql(self, sql):
+        translated = self._translated.get(sql)
+        if translated is None:
+            translated = self._translated[sql] = to_postgres(sql)
+        return translated
+
+    async def _run(self, op, fn, *args):
+        started = time.perf_counter()
+        try:
+            async with self._pool.acquire() as conn:
+                return await fn(conn, *args)
+        finally:
+            DB_LATENCY.labels(op).observe(time.perf_counter() - started)
+
+    # Lifecycle
+    async def open(self):
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(self.url, min_size=PG_POOL_MIN, max_size=PG_POOL_MAX,
+                                                   statement_cache_size=PG_STATEMENT_CACHE)
+            async with self._pool.acquire() as conn:
+                await self._migrate(conn)
+            logger.info("🗄️ Database ready: PostgreSQL")
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @staticmethod
+    async def _migrate(conn):
+        async with conn.transaction():
+            # Doosra replica migrate kar raha ho to uske khatam hone tak ruko
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK)
+            await conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+            version = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            for target, name, steps in MIGRATIONS:
+                if target <= version:
+                    continue
+                started = time.perf_counter()
+                async with conn.transaction():
+                    for step in steps:
+                        await conn.execute(step)
+                    await conn.execute("INSERT INTO schema_version (version) VALUES ($1)", target)
+                logger.info(f"🗄️ Migration v{target} applied: {name} ({time.perf_counter() - started:.2f}s)")
+
+    async def check(self):
+        return await self._run('check', self._check)
+
+    async def _check(self, conn):
+        plans = []
+        async with conn.transaction():
+            # Chhoti tables pe planner waise bhi seq scan chunta hai - sirf "index hi nahi" wale dikhein
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            await conn.execute("SET LOCAL enable_sort = off")
+            # NULL params pe custom plan WHERE ko constant-false bana deta hai - generic plan dekho,
+            # jo asyncpg ke prepared statements asal me chalate hain
+            await conn.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+            for name, sql in hot_statements():
+                sql = self._sql(sql)
+                count = len(set(re.findall(r'\$\d+', sql)))
+                args = f"({', '.join(['NULL'] * count)})" if count else ''
+                try:
+                    # Har statement apne savepoint me - ek fail ho to baaki report chalti rahe
+                    async with conn.transaction():
+                        await conn.execute(f"PREPARE dbcheck AS {sql}")
+                    try:
+                        async with conn.transaction():
+                            rows = await conn.fetch(f"EXPLAIN EXECUTE dbcheck{args}")
+                    finally:
+                        # Prepared statement transaction ke saath rollback nahi hota
+                        await conn.execute("DEALLOCATE dbcheck")
+                    details = [row[0].strip().lstrip('->').strip() for row in rows]
+                except asyncpg.PostgresError as e:
+                    plans.append((name, [], [f"EXPLAIN failed: {e}"]))
+                    continue
+                problems = [] if name.split('[')[0] in FULL_SCAN_OK else [
+                    d for d in details if d.startswith(('Seq Scan', 'Sort '))]
+                plans.append((name, details, problems))
+        return {
+            'version': await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version"),
+            'page_size': int(await conn.fetchval("SHOW block_size")),
+            'journal_mode': 'postgres ' + await conn.fetchval("SHOW server_version"),
+            'plans': plans,
+        }
+
+    # Generic access
+    async def execute(self, sql, params=()):
+        return await self._run('execute', self._execute, sql, params)
+
+    async def _execute(self, conn, sql, params):
+        return _rowcount(await conn.execute(self._sql(sql), *params))
+
+    async def executemany(self, sql, rows):
+        # asyncpg executemany ek hi prepared statement ko pipeline karta hai
+        return await self._run('executemany', self._executemany, sql, rows)
+
+    async def _executemany(self, conn, sql, rows):
+        async with conn.transaction():
+            await conn.executemany(self._sql(sql), rows)
+
+    async def write_batch(self, batch):
+        await self._run('write_batch', self._write_batch, batch)
+
+    async def _write_batch(self, conn, batch):
+        async with conn.transaction():
+            for sql, rows in batch:
+                if rows:
+                    await conn.executemany(self._sql(sql), rows)
+
+    async def fetchone(self, sql, params=()):
+        return await self._run('fetchone', self._fetchone, sql, params)
+
+    async def _fetchone(self, conn, sql, params):
+        row = await conn.fetchrow(self._sql(sql), *params)
+        return tuple(row) if row is not None else None
+
+    async def fetchall(self, sql, params=()):
+        return await self._run('fetchall', self._fetchall, sql, params)
+
+    async def _fetchall(self, conn, sql, params):
+        return [tuple(row) for row in await conn.fetch(self._sql(sql), *params)]
+
+    async def import_rows(self, table, rows):
+        return await self._run('import_rows', self._import_rows, table, rows)
+
+    @staticmethod
+    async def _import_rows(conn, table, rows):
+        # Rows -> har column ka ek array
+        return _rowcount(await conn.execute(PG_IMPORT[table], *map(list, zip(*rows))))
+
+    # Multi-step queries
+    async def chats_page(self, cursor=None, backwards=False, prefix=None, limit=50):
+        return await self._run('chats_page', self._chats_page, cursor, backwards, prefix, limit)
+
+    @staticmethod
+    async def _chats_page(conn, cursor, backwards, prefix, limit):
+        search = prefix is not None
+        params = (prefix,) if search else ()
+        keys = await conn.fetchrow(PG_CHAT_SORT_KEYS, cursor) if cursor is not None else None
+        if keys is None:
+            rows = await conn.fetch(PG_CHATS_FIRST_PAGE[search], *params, limit + 1)
+            return [tuple(row) for row in rows[:limit]], False, len(rows) > limit
+
+        sort_key = keys[1] if search else keys[0]
+        rows = await conn.fetch(PG_CHATS_PAGE[search, backwards], *params, sort_key, cursor, limit + 1)
+        more = len(rows) > limit
+        rows = [tuple(row) for row in rows[:limit]]
+        if backwards:
+            return rows[::-1], more, True
+        return rows, True, more
+
+    async def create_broadcast_job(self, message, broadcast_type):
+        return await self._run('create_job', self._create_job, message, broadcast_type)
+
+    async def _create_job(self, conn, message, broadcast_type):
+        now = datetime.now().isoformat()
+        async with conn.transaction():
+            job_id = await conn.fetchval(self._sql(SQL_CREATE_JOB), message, broadcast_type, JOB_RUNNING, now)
+            total = _rowcount(await conn.execute(self._sql(SQL_JOB_RECIPIENTS[broadcast_type]), job_id))
+            await conn.execute(self._sql(SQL_SET_JOB_TOTAL), total, job_id)
+        return job_id, total
+
+    async def finish_job(self, job_id, status):
+        await self._run('finish_job', self._finish_job, job_id, status)
+
+    async def _finish_job(self, conn, job_id, status):
+        now = datetime.now().isoformat()
+        async with conn.transaction():
+            await conn.execute(self._sql(SQL_SET_JOB_STATUS), status, now, job_id)
+            if status == JOB_DONE:
+                message, broadcast_type = await conn.fetchrow(self._sql(SQL_JOB_MESSAGE), job_id)
+                await conn.execute(self._sql(SQL_LOG_BROADCAST), message, now, broadcast_type)
@@ -0,0 +1,253 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+def _markup(*rows):
+    return InlineKeyboardMarkup([list(row) for row in rows])
+
+
+class Templates:
+    """Every static text and keyboard the bot sends, built once at startup.
+
+    Texts me sirf dynamic fields ({chat_title}, counts waghera) ke
+    placeholders hain, jo har call pe str.format se bharte hain. Keyboards
+    immutable hain aur har variant (owner/non-owner, group/private) ka apna
+    object hai, isliye callback hot path pe kuch naya allocate nahi hota.
+    """
+
+    def __init__(self, support_channel, bot_username, owner_id):
+        self.support_channel = support_channel
+        self.support_url = f"https://t.me/{support_channel[1:]}"
+        self.add_to_group_url = f"https://t.me/{bot_username}?startgroup=true"
+
+        support = InlineKeyboardButton("📢 Support Channel", url=self.support_url)
+        help_button = InlineKeyboardButton("🆘 Help", callback_data="help")
+        back = InlineKeyboardButton("🔙 Back", callback_data="back")
+        self._support_button, self._back_button, self._help_button = support, back, help_button
+        self._settings_keyboards = {}
+        add_to_group = InlineKeyboardButton("👥 Add to Group", url=self.add_to_group_url)
+
+        # Keyboards
+        self.support_back_keyboard = _markup([support], [back])
+        self.support_help_keyboard = _markup([support], [help_button])
+        self.group_welcome_keyboard = _markup(
+            [support],
+            [InlineKeyboardButton("⚙️ Bot Settings", callback_data="group_settings"), help_button],
+        )
+        self.owner_welcome_keyboard = _markup(
+            [InlineKeyboardButton("📊 Stats", callback_data="stats"),
+             InlineKeyboardButton("📢 Broadcast", callback_data="broadcast_menu")],
+            [InlineKeyboardButton("👥 Managed Groups", callback_data="chats"), help_button],
+            [support],
+            [add_to_group],
+        )
+        self.user_welcome_keyboard = _markup([support], [help_button, add_to_group])
+        self.owner_notify_keyboard = _markup(
+            [InlineKeyboardButton("👥 View Groups", callback_data="chats"),
+             InlineKeyboardButton("📊 Stats", callback_data="stats")],
+        )
+
+        # Welcome texts
+        self.group_welcome_text = f"""
+🎉 <b>Hello {{chat_title}}!</b>
+
+🤖 <b>I'm Join Hider Bot</b> - Your friendly group assistant!
+
+✅ <b>I will automatically hide all join/leave messages</b>
+✅ <b>No more spammy notifications</b>
+✅ <b>Clean chat experience</b>
+
+<b>To get started:</b>
+1️⃣ Make me admin in this group
+2️⃣ Grant me delete message permission
+3️⃣ I'll start working automatically!
+
+<b>Support:</b> {support_channel}
+"""
+        self.user_welcome_text = f"""
+🎉 <b>Welcome to Join Hider Bot!</b>
+
+Hello <b>{{user_name}}</b>! I will hide join/leave messages in your groups.
+
+<b>Features:</b>
+✅ Hide new member join messages
+✅ Hide member leave messages
+
+<b>Support Channel:</b> {support_channel}
+"""
+        self.owner_welcome_text = (self.user_welcome_text
+                                   + "\n<b>👑 Owner Panel:</b> You have access to admin features!")
+        self.default_welcome_text = f"""
+🎉 <b>Welcome to Join Hider Bot!</b>
+
+🤖 I will hide join/leave messages in your groups.
+
+<b>Features:</b>
+✅ Auto hide join/leave messages
+
+<b>Support:</b> {support_channel}
+"""
+        self.fallback_welcome_text = f"🎉 Welcome to Join Hider Bot!\n\nSupport: {support_channel}"
+
+        # Group settings - /settings command aur settings button dono yahi text use karte hain
+        self.group_settings_text = f"""
+<b>⚙️ Group Settings - {{chat_title}}</b>
+
+<b>Group ID:</b> <code>{{chat_id}}</code>
+
+<b>Bot Features:</b>
+{{join}} Join messages hidden
+{{leave}} Leave messages hidden
+{{all}} All service messages hidden (pins, title/photo changes, video chats)
+✅ Welcome messages enabled
+
+<i>Admins can toggle these with the buttons below.</i>
+
+<b>Admin Commands:</b>
+/settings - Show and change these settings
+/start - Bot info
+
+<b>Support:</b> {support_channel}
+"""
+        self.delete_rights_hint_text = (
+            "⚠️ <b>I can't hide join/leave messages here yet.</b>\n\n"
+            "Admins: please make me admin with the <b>Delete messages</b> permission."
+        )
+        self.settings_private_text = (
+            f"ℹ️ This command works only in groups!\n\n"
+            f"Add me to a group and make me admin to use this feature.\n\n"
+            f"<b>Support:</b> {support_channel}"
+        )
+
+        # Owner panels
+        self.stats_text = f"""
+<b>📊 Bot Statistics</b>
+
+<b>👥 Managed Groups:</b> {{live_chats}} (of {{chats}} ever joined)
+<b>👤 Total Users:</b> {{users}}
+<b>📢 Group Broadcasts Sent:</b> {{group_broadcasts}}
+<b>📢 User Broadcasts Sent:</b> {{user_broadcasts}}
+
+<b>🆔 Owner ID:</b> {owner_id}
+<b>🔧 Status:</b> ✅ Running
+<b>💡 Support:</b> {support_channel}
+"""
+        self.stats_command_text = (
+            f"<b>📊 Statistics</b>\n\n"
+            f"• <b>Managed Groups:</b> {{live_chats}}\n"
+            f"• <b>Total Users:</b> {{users}}\n"
+            f"• <b>Support:</b> {support_channel}"
+        )
+        self.chats_text = "<b>👥 Managed Chats</b>\n\n{chat_list}"
+        self.chat_line = "• {title} (<code>{chat_id}</code>) - {added}"
+        self.chats_search_text = "<b>🔍 Chats starting with</b> <code>{query}</code>\n\n{chat_list}"
+        self.chats_footer = "\n\n🔍 Search by title: <code>/chats title</code>"
+        self.no_chats_text = "❌ No chats managed yet.\nAdd me to a group and make me admin!"
+        self.no_chat_matches_text = "❌ No chats found starting with <code>{query}</code>"
+        self.chats_search_too_long_text = "❌ Search text is too long (max {limit} bytes)."
+        self.gbroadcast_menu_text = (
+            f"<b>📢 Broadcast to Groups</b>\n\n"
+            f"Please use command:\n"
+            f"<code>/gbroadcast your_message_here</code>\n\n"
+            f"<b>Example:</b>\n"
+            f"<code>/gbroadcast Hello groups! New update available.</code>\n\n"
+            f"<b>Support Channel:</b> {support_channel}"
+        )
+        self.broadcast_menu_text = (
+            f"<b>📢 Broadcast to Users</b>\n\n"
+            f"Please use command:\n"
+            f"<code>/broadcast your_message_here</code>\n\n"
+            f"<b>Example:</b>\n"
+            f"<code>/broadcast Hello users! Check out new features.</code>\n\n"
+            f"<b>Support Channel:</b> {support_channel}"
+        )
+        self.help_text = f"""
+<b>🆘 Help Guide</b>
+
+<b>How to use this bot:</b>
+1. Add me to your group
+2. Make me admin with delete permissions
+3. I'll automatically hide join/leave messages
+
+<b>Owner Commands:</b>
+/start - Bot menu
+/stats - View statistics
+/chats [title] - Browse or search managed groups
+
+<b>Support:</b>
+If you need help, join our support channel: {support_channel}
+
+<b>Features:</b>
+• Auto hide join messages
+• Auto hide leave messages
+"""
+
+        # Owner notifications
+        self.bot_added_text = (
+            "✅ <b>Bot added to new group!</b>\n\n"
+            "<b>Group:</b> {chat_title}\n"
+            "<b>ID:</b> <code>{chat_id}</code>\n"
+            "<b>Date:</b> {date}"
+        )
+        self.bot_removed_text = (
+            "❌ <b>Bot removed from group!</b>\n\n"
+            "<b>Group:</b> {chat_title}\n"
+            "<b>ID:</b> <code>{chat_id}</code>\n"
+            "<b>Date:</b> {date}"
+        )
+        self.owner_digest_text = (
+            "<b>📬 Group activity - last {minutes} min</b>\n\n"
+            "✅ Added to <b>{added}</b> group(s)\n"
+            "❌ Removed from <b>{removed}</b> group(s)\n\n"
+            "<b>Latest:</b>\n{lines}"
+        )
+        self.digest_line = "{mark} {title} (<code>{chat_id}</code>)"
+
+        # /export, /import
+        self.export_usage_text = "❌ Usage: /export chats|users [csv]"
+        self.exporting_text = "⏳ Exporting {table}..."
+        self.export_caption = "📤 {count} {table} exported ({fmt})"
+        self.export_failed_text = "❌ Export failed: {error}"
+        self.import_usage_text = "❌ Reply to an export file with: /import chats|users"
+        self.importing_text = "⏳ Importing {table}..."
+        self.import_done_text = (
+            "📥 <b>Import done</b> ({table}, {fmt})\n\n"
+            "➕ New rows: <b>{inserted}</b>\n"
+            "♻️ Already present (kept as is): <b>{present}</b>\n"
+            "⚠️ Invalid rows skipped: <b>{invalid}</b>"
+        )
+        self.import_failed_text = "❌ Import failed: {error}"
+
+        # Owner-only replies
+        self.owner_only_text = f"❌ Only owner can use this command.\n\n💡 Support: {support_channel}"
+        self.owner_only_stats_text = f"❌ Only owner can view statistics.\n\n💡 Support: {support_channel}"
+
+    def settings_keyboard(self, settings):
+        """/settings toggles for one combination of settings (built once per combination)"""
+        key = (settings['join'], settings['leave'], settings['all'])
+        keyboard = self._settings_keyboards.get(key)
+        if keyboard is None:
+            def toggle(name, label):
+                mark = "✅" if settings[name] else "❌"
+                return InlineKeyboardButton(f"{mark} {label}", callback_data=f"set:{name}")
+            keyboard = self._settings_keyboards[key] = _markup(
+                [toggle('join', "Hide joins"), toggle('leave', "Hide leaves")],
+                [toggle('all', "Hide all service messages")],
+                [self._support_button],
+                [self._help_button, self._back_button],
+            )
+        return keyboard
+
+    def group_settings(self, chat_title, chat_id, settings):
+        """/settings text with the chat's current toggles"""
+        marks = {name: "✅" if value else "❌" for name, value in settings.items()}
+        return self.group_settings_text.format(chat_title=chat_title, chat_id=chat_id, **marks)
+
+    def chats_keyboard(self, prev_data=None, next_data=None):
+        """Managed Groups page keyboard; prev/next buttons carry the page cursor"""
+        nav = []
+        if prev_data:
+            nav.append(InlineKeyboardButton("◀️ Prev", callback_data=prev_data))
+        if next_data:
+            nav.append(InlineKeyboardButton("Next ▶️", callback_data=next_data))
+        rows = [nav] if nav else []
+        return _markup(*rows, [self._support_button], [self._back_button])
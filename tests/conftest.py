@@ -0,0 +1,70 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+# Bot ke modules repo root pe hain (package nahi)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import SQLiteStorage
+
+# Postgres backend isi DSN pe test hota hai (tables har test me khali hoti hain!); na ho to
+# pgserver ka embedded Postgres (requirements-dev.txt)
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "")
+PG_TABLES = ('chats', 'users', 'broadcast', 'media_cache', 'chat_settings', 'membership_events',
+             'broadcast_jobs', 'broadcast_recipients')
+
+
+async def _reset_postgres(storage):
+    # TRUNCATE pe row triggers nahi chalte - counters bhi khud zero
+    await storage.execute(f"TRUNCATE {', '.join(PG_TABLES)} RESTART IDENTITY")
+    await storage.execute("UPDATE counters SET value = 0")
+
+
+@pytest.fixture(scope='session')
+def postgres_url(tmp_path_factory):
+    """TEST_DATABASE_URL, or a throwaway embedded Postgres for the whole test session"""
+    pytest.importorskip('asyncpg')
+    if TEST_DATABASE_URL:
+        yield TEST_DATABASE_URL
+        return
+    pgserver = pytest.importorskip('pgserver', reason="set TEST_DATABASE_URL or pip install -r requirements-dev.txt")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp('postgres')), cleanup_mode='stop')
+    try:
+        yield server.get_uri()
+    finally:
+        server.cleanup()
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def run_storage(request, tmp_path):
+    """run_storage(test) opens a fresh backend, awaits test(storage) and closes it.
+
+    Har test ek hi asyncio.run me chalta hai - asyncpg pool apne event loop
+    se bandha hota hai, isliye storage loop ke andar hi banta aur band hota hai.
+    """
+    if request.param == 'postgres':
+        url = request.getfixturevalue('postgres_url')
+        from storage_pg import PostgresStorage
+
+        def make():
+            return PostgresStorage(url)
+        reset = _reset_postgres
+    else:
+        def make():
+            return SQLiteStorage(str(tmp_path / 'bot_data.db'))
+        reset = None
+
+    def run(test):
+        async def main():
+            storage = make()
+            await storage.open()
+            try:
+                if reset is not None:
+                    await reset(storage)
+                return await test(storage)
+            finally:
+                await storage.close()
+        return asyncio.run(main())
+    return run
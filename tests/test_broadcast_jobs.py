@@ -0,0 +1,141 @@
+import asyncio
+
+from storage import JOB_DONE, JOB_CANCELLED, JOB_RUNNING
+from registry import Registry
+from broadcast import BroadcastEngine, BroadcastJobs, TokenBucket
+from chat_settings import ChatSettings, DEFAULT_SETTINGS
+
+
+class FakeBot:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.sent.append(chat_id)
+
+
+def replica(storage, owner, lease=60):
+    """One bot process' BroadcastJobs - replicas in tests share the database, not memory"""
+    engine = BroadcastEngine(TokenBucket(100000), workers=4)
+    return BroadcastJobs(storage, engine, Registry(storage), flush_size=5, flush_interval=0.05,
+                         owner=owner, lease=lease)
+
+
+async def add_groups(storage, count):
+    await storage.import_rows('chats', [(-index, f"Group {index}", "2024-01-01", 1, None, None)
+                                        for index in range(1, count + 1)])
+    return set(range(-count, 0))
+
+
+def test_job_claim_is_exclusive(run_storage):
+    async def test(storage):
+        await add_groups(storage, 3)
+        job_id, _ = await storage.create_broadcast_job("Hi", 'groups')
+
+        claims = await asyncio.gather(*(storage.claim_job(job_id, f"r{n}", 60) for n in range(5)))
+        assert claims.count(True) == 1
+        owner = f"r{claims.index(True)}"
+        other = 'r9'
+
+        assert not await storage.claim_job(job_id, other, 60)
+        assert await storage.claim_job(job_id, owner, 60)
+        assert await storage.renew_job(job_id, owner, 60)
+        assert not await storage.renew_job(job_id, other, 60)
+
+        await storage.release_job(job_id, owner)
+        assert await storage.claim_job(job_id, other, -1)
+        # Lease khatam - owner mara hua maana jaata hai
+        assert await storage.claim_job(job_id, owner, 60)
+
+        await storage.finish_job(job_id, JOB_CANCELLED)
+        assert not await storage.renew_job(job_id, owner, 60)
+        assert not await storage.claim_job(job_id, other, 60)
+    run_storage(test)
+
+
+def test_two_replicas_send_a_job_once(run_storage):
+    async def test(storage):
+        audience = await add_groups(storage, 30)
+        first, second = replica(storage, 'first'), replica(storage, 'second')
+        job_id, total = await first.create("Hello", 'groups')
+        assert total == 30
+        assert await second.resumable() == []
+
+        bot_first, bot_second = FakeBot(0.001), FakeBot(0.001)
+        jobs = await asyncio.gather(first.run(job_id, bot_first), second.run(job_id, bot_second))
+        assert bot_second.sent == []
+        assert sorted(bot_first.sent) == sorted(audience)
+        assert jobs[0]['status'] == JOB_DONE
+        assert jobs[0]['owner'] is None
+    run_storage(test)
+
+
+def test_cancel_on_another_replica_stops_the_sender(run_storage):
+    async def test(storage):
+        await add_groups(storage, 200)
+        sender, other = replica(storage, 'sender'), replica(storage, 'other')
+        job_id, _ = await sender.create("Hello", 'groups')
+
+        bot = FakeBot(0.01)
+        running = asyncio.create_task(sender.run(job_id, bot))
+        await asyncio.sleep(0.1)
+        assert await other.cancel(job_id)
+        job = await asyncio.wait_for(running, 5)
+
+        assert job['status'] == JOB_CANCELLED
+        assert 0 < len(bot.sent) < 200
+        assert job['progress']['pending'] == 200 - len(bot.sent)
+    run_storage(test)
+
+
+def test_paused_job_is_taken_over_without_duplicates(run_storage):
+    async def test(storage):
+        audience = await add_groups(storage, 100)
+        old, new = replica(storage, 'old'), replica(storage, 'new')
+        job_id, _ = await old.create("Hello", 'groups')
+
+        bot_old, bot_new = FakeBot(0.005), FakeBot(0.001)
+        running = asyncio.create_task(old.run(job_id, bot_old))
+        await asyncio.sleep(0.05)
+        # Rolling deploy - purana replica rukta hai, naya bache hue recipients bhejta hai
+        old.pause_all()
+        job = await running
+        assert job['status'] == JOB_RUNNING
+        assert job['owner'] is None
+
+        assert [job['id'] for job in await new.resumable()] == [job_id]
+        job = await new.run(job_id, bot_new)
+        assert job['status'] == JOB_DONE
+        assert not set(bot_old.sent) & set(bot_new.sent)
+        assert sorted(bot_old.sent + bot_new.sent) == sorted(audience)
+    run_storage(test)
+
+
+def test_dead_replica_lease_expires(run_storage):
+    async def test(storage):
+        audience = await add_groups(storage, 10)
+        job_id, _ = await storage.create_broadcast_job("Hello", 'groups')
+        assert await storage.claim_job(job_id, 'dead', -1)
+
+        survivor = replica(storage, 'survivor')
+        assert [job['id'] for job in await survivor.resumable()] == [job_id]
+        bot = FakeBot()
+        job = await survivor.run(job_id, bot)
+        assert job['status'] == JOB_DONE
+        assert sorted(bot.sent) == sorted(audience)
+    run_storage(test)
+
+
+def test_chat_settings_refresh_sees_other_replica(run_storage):
+    async def test(storage):
+        mine, theirs = ChatSettings(storage), ChatSettings(storage)
+        await mine.load()
+        await theirs.load()
+        assert (await theirs.toggle(-1, 'all'))['all'] is True
+        assert mine.get(-1) == DEFAULT_SETTINGS
+
+        assert await mine.refresh()
+        assert mine.get(-1)['all'] is True
+    run_storage(test)
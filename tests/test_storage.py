@@ -0,0 +1,195 @@
+import asyncio
+from datetime import datetime
+
+from storage import JOB_DONE, SQL_SET_CHAT_ACTIVE
+from registry import Registry
+from transfer import export_table, import_table, CSV, JSONL
+
+
+def chat_row(chat_id, title, added_date, active=1):
+    return (chat_id, title, added_date, active, None, None)
+
+
+def user_row(user_id, username, active=1):
+    return (user_id, username, username.title(), '2024-01-01T00:00:00', active, None, None)
+
+
+async def chat(storage, chat_id):
+    return await storage.fetchone(
+        "SELECT chat_title, active, inactive_reason FROM chats WHERE chat_id=?", (chat_id,))
+
+
+def test_add_chat_keeps_existing_row(run_storage):
+    async def test(storage):
+        await storage.add_chat(-100, "First")
+        await storage.add_chat(-100, "Second")
+        assert await chat(storage, -100) == ("First", 1, None)
+    run_storage(test)
+
+
+def test_add_chat_replace_resets_row(run_storage):
+    async def test(storage):
+        await storage.add_chat(-100, "Old")
+        await storage.execute(SQL_SET_CHAT_ACTIVE, (0, 'kicked', datetime.now().isoformat(), -100))
+        assert await chat(storage, -100) == ("Old", 0, 'kicked')
+        await storage.add_chat(-100, "New", replace=True)
+        assert await chat(storage, -100) == ("New", 1, None)
+    run_storage(test)
+
+
+def test_registry_flush_writes_one_batch(run_storage):
+    async def test(storage):
+        registry = Registry(storage, flush_size=10 ** 6)
+        await registry.load()
+        registry.add_chat(-1, "One")
+        registry.add_chat(-2, "Two")
+        registry.add_chat(-1, "One renamed")
+        registry.add_user(7, 'seven', "Seven")
+        registry.add_user(7, 'seven', "Seven")
+        registry.deactivate_chat(-2, 'kicked')
+        await registry.flush()
+        assert registry.pending == 0
+
+        chats, users = await storage.load_known_ids()
+        assert sorted(chats) == [(-2, "Two", 0), (-1, "One renamed", 1)]
+        assert users == [(7, 1)]
+    run_storage(test)
+
+
+def test_chats_page_next_prev_and_prefix(run_storage):
+    async def test(storage):
+        titles = ["alpha one", "Alpha two", "alphabet", "Beta", "gamma"]
+        await storage.import_rows('chats', [
+            chat_row(-index, title, f"2024-01-0{index}") for index, title in enumerate(titles, 1)])
+
+        def ids(page):
+            rows, has_prev, has_next = page
+            return [row[0] for row in rows], has_prev, has_next
+
+        # Newest first
+        assert ids(await storage.chats_page(limit=2)) == ([-5, -4], False, True)
+        assert ids(await storage.chats_page(cursor=-4, limit=2)) == ([-3, -2], True, True)
+        assert ids(await storage.chats_page(cursor=-2, limit=2)) == ([-1], True, False)
+        assert ids(await storage.chats_page(cursor=-3, backwards=True, limit=2)) == ([-5, -4], False, True)
+
+        # Title prefix, case-insensitive, title order
+        assert ids(await storage.chats_page(prefix="ALP", limit=2)) == ([-1, -2], False, True)
+        assert ids(await storage.chats_page(cursor=-2, prefix="ALP", limit=2)) == ([-3], True, False)
+        assert ids(await storage.chats_page(cursor=-3, backwards=True, prefix="alp", limit=2)) == (
+            [-1, -2], False, True)
+        assert ids(await storage.chats_page(prefix="zzz", limit=2)) == ([], False, False)
+    run_storage(test)
+
+
+def test_broadcast_job_lifecycle(run_storage):
+    async def test(storage):
+        await storage.import_rows('chats', [
+            chat_row(-1, "One", "2024-01-01"),
+            chat_row(-2, "Two", "2024-01-02"),
+            chat_row(-3, "Three", "2024-01-03"),
+            chat_row(-4, "Gone", "2024-01-04", active=0),
+        ])
+        job_id, total = await storage.create_broadcast_job("Hello", 'groups')
+        assert total == 3
+
+        pending = [row async for row in storage.iter_pending_recipients(job_id, batch_size=2)]
+        assert pending == [(-3, "Three"), (-2, "Two"), (-1, "One")]
+
+        await storage.set_recipient_statuses([('sent', job_id, -3), ('failed', job_id, -1)])
+        pending = [row async for row in storage.iter_pending_recipients(job_id, batch_size=2)]
+        assert pending == [(-2, "Two")]
+        assert await storage.get_job_progress(job_id) == {'sent': 1, 'failed': 1, 'pending': 1}
+
+        await storage.finish_job(job_id, JOB_DONE)
+        job = await storage.get_job(job_id)
+        assert job['status'] == JOB_DONE
+        assert job['finished'] is not None
+        assert job['message'] == "Hello"
+        assert (await storage.get_stats())['group_broadcasts'] == 1
+    run_storage(test)
+
+
+def test_get_stats_counters(run_storage):
+    async def test(storage):
+        await storage.add_chat(-1, "One")
+        await storage.add_chat(-2, "Two")
+        await storage.add_chat(-3, "Three")
+        await storage.add_chat(-3, "Three again")
+        await storage.add_user(1, 'one', "One")
+        await storage.add_user(2, 'two', "Two")
+        await storage.add_user(2, 'two', "Two")
+        now = datetime.now().isoformat()
+        await storage.execute(SQL_SET_CHAT_ACTIVE, (0, 'kicked', now, -1))
+        await storage.execute(SQL_SET_CHAT_ACTIVE, (0, 'kicked', now, -2))
+        # Replace upsert wapas live karta hai
+        await storage.add_chat(-2, "Two", replace=True)
+
+        job_id, total = await storage.create_broadcast_job("Hi users", 'users')
+        assert total == 2
+        await storage.finish_job(job_id, JOB_DONE)
+
+        stats = await storage.get_stats()
+        assert stats == {'chats': 3, 'live_chats': 2, 'users': 2, 'group_broadcasts': 0, 'user_broadcasts': 1}
+    run_storage(test)
+
+
+def test_iter_table_and_import_rows(run_storage):
+    async def test(storage):
+        rows = [user_row(user_id, f"user{user_id}") for user_id in (5, 1, 3)]
+        assert await storage.import_rows('users', rows) == 3
+        # Pehle se maujood rows wahi rehti hain, sirf nayi ginti me
+        changed = user_row(1, 'renamed')
+        assert await storage.import_rows('users', [changed, user_row(9, 'user9', active=0)]) == 1
+
+        batches = [batch async for batch in storage.iter_table('users', batch_size=2)]
+        assert [len(batch) for batch in batches] == [2, 2]
+        exported = [tuple(row) for batch in batches for row in batch]
+        assert exported == sorted(rows + [user_row(9, 'user9', active=0)])
+    run_storage(test)
+
+
+def test_export_import_round_trip(run_storage, tmp_path):
+    async def test(storage):
+        await storage.import_rows('chats', [chat_row(-1, "One", "2024-01-01"),
+                                            chat_row(-2, "Two, with comma", "2024-01-02", active=0)])
+        for fmt in (JSONL, CSV):
+            path = str(tmp_path / f"chats.{fmt}.gz")
+            assert await export_table(storage, 'chats', path, fmt) == 2
+            assert await import_table(storage, 'chats', path, fmt) == (0, 2, 0)
+
+        bad = tmp_path / "chats.jsonl"
+        bad.write_text('{"chat_id": -3, "chat_title": "Three"}\nnot json\n{"chat_title": "no id"}\n')
+        assert await import_table(storage, 'chats', str(bad), JSONL) == (1, 0, 2)
+        assert await chat(storage, -3) == ("Three", 1, None)
+    run_storage(test)
+
+
+def test_check_finds_no_plan_problems(run_storage):
+    async def test(storage):
+        report = await storage.check()
+        assert report['plans']
+        assert [(name, problems) for name, _, problems in report['plans'] if problems] == []
+    run_storage(test)
+
+
+def test_postgres_replicas_migrate_once(postgres_url):
+    from storage_pg import PostgresStorage, MIGRATIONS
+
+    async def main():
+        # Khali database - teen replicas ek saath start
+        admin = PostgresStorage(postgres_url)
+        await admin.open()
+        await admin.execute("DROP SCHEMA public CASCADE")
+        await admin.execute("CREATE SCHEMA public")
+        await admin.close()
+
+        replicas = [PostgresStorage(postgres_url) for _ in range(3)]
+        await asyncio.gather(*(replica.open() for replica in replicas))
+        try:
+            versions = await replicas[0].fetchall("SELECT version FROM schema_version ORDER BY version")
+            assert versions == [(version,) for version, _, _ in MIGRATIONS]
+            assert dict(await replicas[1].fetchall("SELECT name, value FROM counters")) == {
+                'chats': 0, 'live_chats': 0, 'users': 0, 'group_broadcasts': 0, 'user_broadcasts': 0}
+        finally:
+            await asyncio.gather(*(replica.close() for replica in replicas))
+    asyncio.run(main())
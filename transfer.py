@@ -0,0 +1,134 @@
+import io
+import os
+import csv
+import gzip
+import json
+import asyncio
+import logging
+
+from storage import TRANSFER_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Export/import me ek DB round-trip / transaction me kitni rows
+TRANSFER_BATCH_SIZE = int(os.environ.get("TRANSFER_BATCH_SIZE", 1000))
+# Ye columns file me text ho sakte hain (CSV) - wapas int
+INT_COLUMNS = {'chat_id', 'user_id', 'active'}
+
+JSONL = 'jsonl'
+CSV = 'csv'
+
+
+def file_format(name):
+    """JSONL or CSV from a file name like chats.csv.gz"""
+    name = (name or '').lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return CSV if name.endswith('.csv') else JSONL
+
+
+def _encode(fmt, columns, rows, header):
+    buffer = io.StringIO()
+    if fmt == CSV:
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(columns)
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            buffer.write('\n')
+    return buffer.getvalue().encode()
+
+
+def _decode(record, columns):
+    """One parsed record (dict) -> row tuple, or None if it has no usable id"""
+    row = []
+    for column in columns:
+        value = record.get(column)
+        if value == '':
+            value = None
+        if value is not None and column in INT_COLUMNS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                return None
+        row.append(value)
+    if row[0] is None:
+        return None
+    if row[columns.index('active')] is None:
+        row[columns.index('active')] = 1
+    return tuple(row)
+
+
+def _records(fmt, f):
+    if fmt == CSV:
+        yield from csv.DictReader(f)
+        return
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield {}
+            continue
+        yield record if isinstance(record, dict) else {}
+
+
+def _read_batches(path, fmt, columns, batch_size):
+    """Blocking generator: (rows, invalid count) batches from a (gzipped) export file"""
+    with open(path, 'rb') as raw:
+        gzipped = raw.read(2) == b'\x1f\x8b'
+    opener = gzip.open if gzipped else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        rows, invalid = [], 0
+        for record in _records(fmt, f):
+            row = _decode(record, columns)
+            if row is None:
+                invalid += 1
+                continue
+            rows.append(row)
+            if len(rows) >= batch_size:
+                yield rows, invalid
+                rows, invalid = [], 0
+        if rows or invalid:
+            yield rows, invalid
+
+
+async def export_table(storage, table, path, fmt=JSONL, batch_size=TRANSFER_BATCH_SIZE):
+    """Stream a table into a gzip file batch by batch; returns the row count"""
+    columns = TRANSFER_COLUMNS[table]
+    count = 0
+    with gzip.open(path, 'wb') as f:
+        async for rows in storage.iter_table(table, batch_size):
+            # Compression thread me - event loop pe nahi
+            await asyncio.to_thread(f.write, _encode(fmt, columns, rows, header=not count))
+            count += len(rows)
+        if not count and fmt == CSV:
+            f.write(_encode(fmt, columns, [], header=True))
+    logger.info(f"📤 Exported {count} {table} row(s) as {fmt}")
+    return count
+
+
+async def import_table(storage, table, path, fmt, batch_size=TRANSFER_BATCH_SIZE):
+    """Stream a (gzipped) export into a table, one transaction per batch; returns (inserted, present, invalid)"""
+    columns = TRANSFER_COLUMNS[table]
+    batches = _read_batches(path, fmt, columns, batch_size)
+    total = inserted = invalid = 0
+    while True:
+        # File padhna/parse karna bhi thread me, ek batch at a time
+        batch = await asyncio.to_thread(next, batches, None)
+        if batch is None:
+            break
+        rows, bad = batch
+        if rows:
+            inserted += await storage.import_rows(table, rows)
+        total += len(rows)
+        invalid += bad
+    # Jo insert nahi hui wo pehle se thi (ya file me do baar thi)
+    present = total - inserted
+    logger.info(f"📥 Imported {inserted} new {table} row(s) from {fmt} "
+                f"({present} already present, {invalid} invalid skipped)")
+    return inserted, present, invalid
@@ -0,0 +1,70 @@
+import hmac
+import json
+import logging
+
+from aiohttp import web
+from telegram import Update
+
+from metrics import render as render_metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebServer:
+    """aiohttp server running on the bot's own event loop.
+
+    Health routes hamesha serve hote hain (Render/Heroku ke liye). Webhook
+    mode me Telegram ke POST updates bhi yahin aate hain aur seedhe
+    Application.update_queue me jaate hain.
+    """
+
+    def __init__(self, application, webhook_path=None, secret_token=None):
+        self.application = application
+        self.webhook_path = webhook_path
+        self.secret_token = secret_token
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/', self.home)
+        self.app.router.add_get('/health', self.health)
+        self.app.router.add_get('/metrics', self.metrics)
+        if webhook_path:
+            self.app.router.add_post(webhook_path, self.webhook)
+
+    async def home(self, request):
+        return web.Response(text="🤖 Join Hider Bot is running!")
+
+    async def health(self, request):
+        return web.Response(text="OK")
+
+    async def metrics(self, request):
+        body, content_type = render_metrics()
+        return web.Response(body=body, headers={'Content-Type': content_type})
+
+    async def webhook(self, request):
+        token = request.headers.get(SECRET_HEADER, '')
+        if self.secret_token and not hmac.compare_digest(token, self.secret_token):
+            logger.warning(f"Webhook request with wrong secret token from {request.remote}")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400)
+
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def start(self, host, port):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"🌐 Web server started on port {port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None